@@ -12,7 +12,7 @@ def login_and_get_token():
     print(payload)
     
     try:
-        response = requests.post(config.AUTH_URL, json=payload)
+        response = requests.post(config.AUTH_URL, json=payload, timeout=getattr(config, "AUTH_TIMEOUT", 30))
         response.raise_for_status()
         
         data = response.json()
@@ -0,0 +1,118 @@
+import numpy as np
+from scipy import sparse
+
+import quote_index
+
+class BM25Index:
+    """
+    Local BM25 index over fixed-size word windows ("passages") of a document.
+    Term weights are precomputed into a sparse passages x terms matrix, so a
+    query is a column slice and a row sum.
+    It is built from the word ids of one or more QuoteIndexes (documents
+    concatenated in order), so word positions from QuoteIndex.locate(), plus
+    the document's offset, map straight onto passages.
+    """
+
+    def __init__(self, quote_indexes, passage_words=200, overlap=50, k1=1.5, b=0.75):
+        # One vocabulary across the documents: map each index's word ids onto it
+        self.vocab = {}
+        self.offsets = []
+        parts = []
+        num_words = 0
+        for quotes in quote_indexes:
+            mapping = np.fromiter((self.vocab.setdefault(w, len(self.vocab)) for w in quotes.vocab),
+                                  dtype=np.int32, count=len(quotes.vocab))
+            parts.append(mapping[quotes.ids] if len(mapping) else quotes.ids)
+            self.offsets.append(num_words)
+            num_words += quotes.num_words
+        ids = np.concatenate(parts) if parts else np.zeros(0, dtype=np.int32)
+        self.num_words = num_words
+
+        stride = max(1, passage_words - overlap)
+        self.passage_words = passage_words
+        self.stride = stride
+        self.starts = np.arange(0, max(1, num_words - overlap), stride, dtype=np.int64)
+
+        # Sparse term-frequency matrix built straight from (row, term) pairs
+        windows = [ids[start:start + passage_words] for start in self.starts]
+        cols = np.concatenate(windows) if windows else np.zeros(0, dtype=np.int32)
+        rows = np.repeat(np.arange(len(windows), dtype=np.int32), [len(w) for w in windows])
+        shape = (len(self.starts), max(1, len(self.vocab)))
+        tf = sparse.csr_matrix((np.ones(len(cols), dtype=np.float32), (rows, cols)), shape=shape)
+        tf.sum_duplicates()
+
+        doc_len = np.asarray(tf.sum(axis=1)).ravel()
+        avg_len = doc_len.mean() if len(doc_len) else 1.0
+        df = np.bincount(tf.indices, minlength=shape[1])
+        idf = np.log(1.0 + (shape[0] - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+        # BM25 weight for every non-zero (passage, term) entry
+        row_norm = k1 * (1 - b + b * doc_len / avg_len)
+        row_of_entry = np.repeat(np.arange(shape[0]), np.diff(tf.indptr))
+        values = tf.data * (k1 + 1) / (tf.data + row_norm[row_of_entry]) * idf[tf.indices]
+        self.weights = sparse.csr_matrix((values.astype(np.float32), tf.indices, tf.indptr), shape=shape).tocsc()
+
+    @property
+    def nbytes(self):
+        """Approximate memory held by the index."""
+        weights = self.weights.data.nbytes + self.weights.indices.nbytes + self.weights.indptr.nbytes
+        return weights + self.starts.nbytes + 100 * len(self.vocab)
+
+    def scores(self, query):
+        terms = [self.vocab[w] for w in quote_index.tokenize(query) if w in self.vocab]
+        if not terms:
+            return np.zeros(self.weights.shape[0], dtype=np.float32)
+        return np.asarray(self.weights[:, terms].sum(axis=1)).ravel()
+
+    def passages_covering(self, start, length):
+        """Indices of passages overlapping words [start, start + length)."""
+        end = start + max(1, length)
+        return np.flatnonzero((self.starts < end) & (self.starts + self.passage_words > start))
+
+    def rank_of(self, query, gold):
+        """1-based rank of the best gold passage for `query` (ties count against it)."""
+        if len(gold) == 0:
+            return None
+        scores = self.scores(query)
+        best_gold = scores[gold].max()
+        if best_gold <= 0:
+            return None
+        return int((scores > best_gold).sum()) + 1
+
+def score_cases(cases, quote_indexes, top_k=5, passage_words=200, min_quote_score=0.6, lease=None):
+    """
+    Adds retrieval difficulty to each case's metadata, with no remote calls:
+      bm25_rank   - rank of the passage holding the gold quote when the question is the query
+      retrievable - "Yes" if that rank is within top_k, else "No"
+      difficulty  - "easy" (rank 1), "medium" (within top_k) or "hard"
+    `quote_indexes` are the documents' QuoteIndexes (already built for the
+    quote check); passages are ranked across all of them. With a `lease`
+    (file_reader.MemoryCeiling) the index's memory is charged to it.
+    Cases whose quote can't be located get no scores.
+    """
+    if not cases:
+        return cases
+    index = BM25Index(quote_indexes, passage_words=passage_words)
+    if lease is not None:
+        lease.charge(index.nbytes)
+
+    for item in cases:
+        meta = item.setdefault("metadata", {})
+        quote = quote_index.quote_of(item)
+        if quote is None:
+            continue
+        score, start = None, None
+        for offset, quotes in zip(index.offsets, quote_indexes):
+            found, pos = quotes.locate(quote)
+            if found is not None and pos is not None and (score is None or found > score):
+                score, start = found, offset + pos
+        if score is None or start is None or score < min_quote_score:
+            continue
+        gold = index.passages_covering(start, len(quote_index.tokenize(quote)))
+        rank = index.rank_of(item.get("question") or "", gold)
+        if rank is None:
+            rank = len(index.starts) + 1
+        meta["bm25_rank"] = rank
+        meta["retrievable"] = "Yes" if rank <= top_k else "No"
+        meta["difficulty"] = "easy" if rank == 1 else ("medium" if rank <= top_k else "hard")
+    return cases
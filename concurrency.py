@@ -0,0 +1,181 @@
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+
+def parse_retry_after(value):
+    """Retry-After header -> seconds to wait (accepts delta-seconds or an HTTP date)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class _Slot:
+    """Outcome of one call made under the limiter (healthy unless told otherwise)."""
+
+    def __init__(self):
+        self.outcome = "ok"
+        self.retry_after = None
+
+    def overloaded(self, retry_after=None):
+        """429/5xx or connection failure: the limit will be cut."""
+        self.outcome = "overloaded"
+        self.retry_after = parse_retry_after(retry_after) if isinstance(retry_after, str) else retry_after
+
+    def neutral(self):
+        """Failure unrelated to load (e.g. a 400): no increase, no decrease."""
+        self.outcome = "neutral"
+
+class AIMDLimiter:
+    """
+    Adaptive concurrency limit (additive increase, multiplicative decrease).
+
+    Each healthy call raises the limit by `increase / limit`, i.e. about +1 per
+    round of calls. A 429/5xx, connection failure or latency above
+    `spike_factor` x the running baseline multiplies the limit by `decrease`,
+    at most once per baseline-latency window so one burst of errors only counts once.
+    A Retry-After value pauses all new calls until it has passed.
+    """
+
+    def __init__(self, initial=2, minimum=1, maximum=16, increase=1.0, decrease=0.5, spike_factor=2.5):
+        self.limit = float(max(minimum, min(initial, maximum)))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase
+        self.decrease = decrease
+        self.spike_factor = spike_factor
+
+        self.in_flight = 0
+        self.baseline = None  # EWMA latency of healthy calls
+        self.blocked_until = 0.0
+        self.last_decrease = 0.0
+        self.cond = threading.Condition()
+
+    def acquire(self, timeout=None):
+        """Waits for a free slot; returns False if `timeout` seconds pass first."""
+        give_up = None if timeout is None else time.monotonic() + timeout
+        with self.cond:
+            while True:
+                now = time.monotonic()
+                if give_up is not None and now >= give_up:
+                    return False
+                left = None if give_up is None else give_up - now
+                wait = self.blocked_until - now
+                if wait > 0:
+                    self.cond.wait(wait if left is None else min(wait, left))
+                    continue
+                if self.in_flight < int(self.limit):
+                    break
+                self.cond.wait(left)
+            self.in_flight += 1
+            return True
+
+    def release(self, latency, outcome="ok", retry_after=None):
+        with self.cond:
+            self.in_flight -= 1
+            now = time.monotonic()
+
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+
+            spike = (outcome == "ok" and self.baseline is not None
+                     and latency > self.spike_factor * self.baseline)
+
+            if outcome == "overloaded" or spike:
+                window = self.baseline or latency or 1.0
+                if now - self.last_decrease > window:
+                    self.limit = max(self.minimum, self.limit * self.decrease)
+                    self.last_decrease = now
+            elif outcome == "ok":
+                self.limit = min(self.maximum, self.limit + self.increase / self.limit)
+
+            if outcome == "ok":
+                # Spikes move the baseline slowly so it can still follow a real shift
+                alpha = 0.02 if spike else 0.1
+                self.baseline = latency if self.baseline is None else (1 - alpha) * self.baseline + alpha * latency
+
+            self.cond.notify_all()
+
+    @contextmanager
+    def slot(self, timeout=None):
+        """
+        with limiter.slot() as slot:
+            response = send()
+            if response.status_code == 429: slot.overloaded(response.headers.get("Retry-After"))
+        Raises TimeoutError if no slot frees up within `timeout` seconds.
+        """
+        if not self.acquire(timeout):
+            raise TimeoutError("no free slot before the deadline")
+        slot = _Slot()
+        started = time.perf_counter()
+        try:
+            yield slot
+        except Exception:
+            if slot.outcome == "ok":
+                slot.neutral()
+            raise
+        finally:
+            self.release(time.perf_counter() - started, slot.outcome, slot.retry_after)
+
+class SingleFlight:
+    """
+    Runs func once per key; concurrent and later callers with the same key
+    get the first call's result instead of repeating it. Exceptions, and
+    results `keep` rejects, are not shared: the next caller runs func itself.
+    Keys belong to a group (e.g. one question); finish(group, callers) drops
+    the group's results once all of its `callers` are done with it.
+    Callers are coroutines on one event loop; finish() may be called from any thread.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.groups = {}  # group -> {"calls": {key: call}, "finished": callers done}
+
+    def _group(self, group):
+        return self.groups.setdefault(group, {"calls": {}, "finished": 0})
+
+    async def do(self, group, key, func, keep=None):
+        """await func()'s result, shared per (group, key); cancel the caller to stop waiting."""
+        while True:
+            with self.lock:
+                calls = self._group(group)["calls"]
+                call = calls.get(key)
+                owner = call is None
+                if owner:
+                    call = calls[key] = {"done": asyncio.Event(), "result": None, "shared": False}
+            if not owner:
+                await call["done"].wait()
+                if call["shared"]:
+                    return call["result"]
+                continue  # that call failed; run it ourselves
+
+            try:
+                result = await func()
+            except BaseException:
+                with self.lock:
+                    calls.pop(key, None)
+                call["done"].set()
+                raise
+            with self.lock:
+                if keep is None or keep(result):
+                    call["result"] = result
+                    call["shared"] = True
+                else:
+                    calls.pop(key, None)
+            call["done"].set()
+            return result
+
+    def finish(self, group, callers):
+        """One caller of `group` is done; the group is dropped after the last of `callers`."""
+        with self.lock:
+            entry = self._group(group)
+            entry["finished"] += 1
+            if entry["finished"] >= callers:
+                del self.groups[group]
@@ -34,6 +34,25 @@ AUTH_PASSWORD = "your_password"  # Your RAG system password
 RAG_QUERY_URL = "rag_system_query_url"
 RAG_TEAM_ID = "rag_team_id"
 
+# Concurrency against the RAG endpoint adapts on its own (AIMD): it starts at
+# RAG_INITIAL_CONCURRENCY, grows while responses stay fast and healthy, and is
+# halved on 429/5xx or latency spikes (honoring Retry-After). RAG_MAX_CONCURRENCY
+# is only a ceiling. Judge (LLM) calls have their own fixed limit.
+RAG_INITIAL_CONCURRENCY = 2
+RAG_MAX_CONCURRENCY = 8
+RAG_MAX_RETRIES = 3
+JUDGE_MAX_CONCURRENCY = 2
+
+# Set to True if the query endpoint streams its answer (SSE or chunked).
+# Streaming mode adds "TTFT (s)" (time to first token) and "Tokens/s" columns.
+RAG_STREAMING = False
+
+# Gzip JSON request bodies of at least COMPRESS_MIN_BYTES (RAG queries and LLM
+# prompts). A server that answers 415 gets plain bodies for the rest of the run.
+# Responses are always accepted gzip-compressed (and brotli, if installed).
+COMPRESS_REQUESTS = False
+COMPRESS_MIN_BYTES = 2048
+
 # ==========================================
 # S3 CONFIGURATION (if applicable)
 # ==========================================
@@ -42,12 +61,95 @@ RAG_TEAM_ID = "rag_team_id"
 
 S3_BASE_PATH = "s3://"
 
+# A/B runs: send every generated question to several RAG targets and judge
+# them side by side (the report gains a Target column and an A-B sheet).
+# Each entry needs a "name"; "query_url", "team_id" and "s3_base_path"
+# default to the settings above. Leave empty for a single target.
+# RAG_TARGETS = [
+#     {"name": "staging", "query_url": "https://staging.example.com/query"},
+#     {"name": "dev", "query_url": "https://dev.example.com/query", "team_id": "dev_team"},
+# ]
+RAG_TARGETS = []
+
 # ==========================================
 # LOCAL SETTINGS
 # ==========================================
 # Default directory to scan for documents
 DEFAULT_INPUT_DIR = "./data"
 
+# Direct mode runs files through a pipeline (extract -> generate -> query ->
+# judge -> upload) so different files are in different stages at once.
+# Workers per stage, and how many files may wait between two stages:
+PIPELINE_EXTRACT_WORKERS = 2
+PIPELINE_GENERATE_WORKERS = 1
+PIPELINE_QUERY_WORKERS = 1
+PIPELINE_JUDGE_WORKERS = 1
+PIPELINE_QUEUE_SIZE = 2
+
+# Ceiling (MB) on extracted document text and its quote/BM25 indexes held at
+# once across the run. Reading waits for other documents to be released; only
+# a document bigger than the ceiling on its own is cut short. Comparison mode
+# only reads the part of each file its prompt uses. 0 = no limit
+READ_MEMORY_LIMIT_MB = 512
+
+# Generated questions quote the document; quotes are checked against the
+# extracted text before any RAG calls are made. "drop" removes cases whose
+# quote can't be found, "flag" keeps them with Quote Verified = No, "off" skips
+# the check. Verified quotes also fix the page number in the REFERENCE column.
+QUOTE_VERIFICATION = "drop"
+QUOTE_MATCH_THRESHOLD = 0.6  # fraction of the quote's words that must match in order
+
+# Offline retrieval baseline: each question's gold passage is ranked with a
+# local BM25 index over PASSAGE_WORDS-word chunks. Adds BM25 Rank, Retrievable
+# (within RETRIEVAL_TOP_K) and Difficulty columns - no extra API calls.
+RETRIEVABILITY_CHECK = True
+RETRIEVAL_TOP_K = 5
+PASSAGE_WORDS = 200
+
+# Timeouts (seconds). Connect/read timeouts apply to every HTTP call; the
+# question budget covers one question's RAG query plus its judge call, and the
+# run limit caps the whole run (0 = no limit). Questions that run out of time
+# get Status "Timed Out"; files not started before the run limit are skipped.
+RAG_CONNECT_TIMEOUT = 10
+RAG_READ_TIMEOUT = 120
+LLM_CONNECT_TIMEOUT = 10
+LLM_READ_TIMEOUT = 120
+# Keep-alive connections held open per LLM provider (Mistral/Groq/OpenRouter)
+LLM_MAX_CONNECTIONS = 20
+AUTH_TIMEOUT = 30
+QUESTION_TIME_BUDGET = 300
+RUN_TIME_LIMIT = 0
+
+# Where `python main.py --profile` writes its reports (one subfolder per run)
+RUN_DIR = "runs"
+
+# Report format for the local results file: "xlsx" (Summary sheet + one sheet
+# per file), "csv" (fastest, single file) or "parquet" (needs pyarrow)
+REPORT_FORMAT = "xlsx"
+
+# Incremental mode: only regenerate questions for documents that changed since
+# the last run, and only re-judge answers whose RAG response text changed.
+# Previous questions and verdicts are kept in MANIFEST_PATH.
+INCREMENTAL_MODE = False
+MANIFEST_PATH = "rag_test_manifest.json"
+
+# Every run's rows are also appended to this SQLite file for comparing runs
+# over time (python warehouse.py accuracy|regressions|flaky). "" turns it off.
+WAREHOUSE_PATH = "rag_results.db"
+
+# Sequential sampling: instead of judging every generated question, draw them
+# in batches spread over documents and question types, and stop once every
+# status rate (Fully/Partially/Wrongly/Not Answered) is known to within
+# +/- SAMPLING_MARGIN at SAMPLING_CONFIDENCE. 0 judges every question.
+# SAMPLING_SCOPE "document" settles each file on its own; "overall" stops as
+# soon as the run-wide estimate is settled. The run-wide estimate only counts
+# as settled once every file's questions are generated, so with many files the
+# first few are judged in full.
+SAMPLING_MARGIN = 0
+SAMPLING_CONFIDENCE = 0.95
+SAMPLING_SCOPE = "document"
+SAMPLING_MIN_PER_STRATUM = 2
+
 # ==========================================
 # GOOGLE SHEETS INTEGRATION (Optional)
 # ==========================================
@@ -57,6 +159,13 @@ DEFAULT_INPUT_DIR = "./data"
 
 GOOGLE_SHEET_ID = "YOUR_GOOGLE_SHEET_ID_HERE"
 
+# Stream rows to the sheet while the run is going instead of uploading each
+# file at the end. Writes are batched every SHEETS_FLUSH_SECONDS and kept under
+# SHEETS_WRITES_PER_MINUTE (the Sheets API allows 60 per minute per user).
+SHEETS_LIVE_UPDATES = True
+SHEETS_FLUSH_SECONDS = 5
+SHEETS_WRITES_PER_MINUTE = 50
+
 # ==========================================
 # NOTES
 # ==========================================
@@ -0,0 +1,80 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Status recorded for questions whose budget (or the run's time limit) ran out
+TIMED_OUT = "Timed Out"
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+class Deadline:
+    """A point in time work must finish by; `seconds=None` never expires."""
+
+    def __init__(self, seconds=None):
+        self.at = math.inf if seconds is None else time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.at - time.monotonic())
+
+    def expired(self):
+        return time.monotonic() >= self.at
+
+    def wait_timeout(self):
+        """remaining() for blocking waits: None instead of infinity."""
+        return None if self.at == math.inf else self.remaining()
+
+    def check(self):
+        if self.expired():
+            raise DeadlineExceeded("deadline exceeded")
+
+    def earliest(self, other):
+        """The tighter of two deadlines."""
+        return self if other is None or self.at <= other.at else other
+
+# Wall-clock limit for the whole run (config.RUN_TIME_LIMIT), set by main()
+RUN = Deadline()
+_local = threading.local()
+
+def start_run(seconds):
+    """Starts the run's wall-clock limit (0 or None: no limit)."""
+    global RUN
+    RUN = Deadline(seconds or None)
+    return RUN
+
+def current():
+    """The deadline in force on this thread: the innermost scope(), capped by the run limit."""
+    deadline = getattr(_local, "deadline", None)
+    return RUN.earliest(deadline)
+
+@contextmanager
+def scope(deadline):
+    """
+    Makes `deadline` (a Deadline, or seconds; None for no extra limit) apply to
+    every call made on this thread inside the block.
+    """
+    if not isinstance(deadline, Deadline):
+        deadline = Deadline(deadline)
+    outer = getattr(_local, "deadline", None)
+    _local.deadline = deadline.earliest(outer)
+    try:
+        yield _local.deadline
+    finally:
+        _local.deadline = outer
+
+def timeout(connect, read):
+    """
+    (connect, read) timeout for requests, with the read timeout cut down to
+    what is left of the current deadline. Raises DeadlineExceeded if none is left.
+    """
+    deadline = current()
+    deadline.check()
+    remaining = deadline.remaining()
+    return min(connect, remaining), min(read, remaining)
+
+def seconds(limit):
+    """A single timeout value (e.g. for SDK calls) capped by the current deadline."""
+    deadline = current()
+    deadline.check()
+    return min(limit, deadline.remaining())
@@ -1,28 +1,399 @@
 import os
-import pypdf
-import docx
+import sys
+import threading
+import zipfile
+import xml.etree.ElementTree as ET
 
-def extract_text_from_pdf(pdf_path):
-    text = ""
+def iter_pdf_pages(pdf_path):
+    """
+    Yields (page_number, section, text) one page at a time, page numbers starting at 1.
+    The file is read through an open handle, so pypdf never loads it into memory whole.
+    """
+    import pypdf
+    with open(pdf_path, "rb") as f:
+        reader = pypdf.PdfReader(f)
+        for number, page in enumerate(reader.pages, 1):
+            yield number, None, page.extract_text() or ""
+
+def extract_pages_from_pdf(pdf_path):
+    """Returns a list of (page_number, text), page numbers starting at 1."""
     try:
-        reader = pypdf.PdfReader(pdf_path)
-        for page in reader.pages:
-            text += page.extract_text() + "\n"
+        return [(number, text) for number, _, text in iter_pdf_pages(pdf_path)]
     except Exception as e:
         print(f"Error reading PDF {pdf_path}: {e}")
         return None
-    return text
+
+def extract_text_from_pdf(pdf_path):
+    pages = extract_pages_from_pdf(pdf_path)
+    if pages is None:
+        return None
+    return "".join(text + "\n" for _, text in pages)
+
+W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+W_BODY = W_NS + "body"
+W_P = W_NS + "p"
+W_TBL = W_NS + "tbl"
+W_TR = W_NS + "tr"
+W_TC = W_NS + "tc"
+W_T = W_NS + "t"
+W_TAB = W_NS + "tab"
+W_BR = W_NS + "br"
+W_CR = W_NS + "cr"
+W_RENDERED_BREAK = W_NS + "lastRenderedPageBreak"
+W_P_STYLE = W_NS + "pStyle"
+W_TYPE = W_NS + "type"
+W_VAL = W_NS + "val"
+
+def _heading_styles(archive):
+    """Maps paragraph style ids to heading levels (1 = top), from word/styles.xml."""
+    levels = {}
+    try:
+        styles = ET.fromstring(archive.read("word/styles.xml"))
+    except (KeyError, ET.ParseError):
+        return levels
+    for style in styles.iter(W_NS + "style"):
+        style_id = style.get(W_NS + "styleId")
+        name = style.find(W_NS + "name")
+        name = (name.get(W_VAL) if name is not None else style_id or "").lower()
+        outline = style.find(f"{W_NS}pPr/{W_NS}outlineLvl")
+        if outline is not None:
+            levels[style_id] = int(outline.get(W_VAL, "0")) + 1
+        elif name == "title":
+            levels[style_id] = 1
+        elif name.startswith("heading "):
+            level = name.split()[-1]
+            levels[style_id] = int(level) if level.isdigit() else 1
+    return levels
+
+def iter_docx_blocks(docx_path):
+    """
+    Streams word/document.xml and yields (page, section, text) per paragraph or
+    table, in document order. Headings are emitted as "# Title" / "## Subtitle"
+    and become the section of the blocks that follow; table rows are emitted as
+    "cell | cell" lines. Pages come from hard page breaks and the page breaks
+    Word records when it saves the file (page 1 throughout if there are none);
+    the rendered break Word records right after a hard one is the same page.
+    Elements are discarded as soon as they are read, so memory stays bounded.
+    """
+    with zipfile.ZipFile(docx_path) as archive:
+        headings = _heading_styles(archive)
+        with archive.open("word/document.xml") as xml:
+            body = None
+            depth = 0
+            page = 1
+            after_hard_break = False  # no text since the last hard page break
+            section = None
+            paragraphs = []  # open paragraphs (text boxes nest inside paragraphs): [parts, style, page]
+            tables = []      # open tables: rows of cells of paragraph texts
+
+            for event, elem in ET.iterparse(xml, events=("start", "end")):
+                tag = elem.tag
+                if event == "start":
+                    depth += 1
+                    if tag == W_BODY:
+                        body = elem
+                    elif tag == W_P:
+                        paragraphs.append([[], None, None])
+                    elif tag == W_TBL:
+                        tables.append([])
+                    elif tag == W_TR and tables:
+                        tables[-1].append([])
+                    elif tag == W_TC and tables and tables[-1]:
+                        tables[-1][-1].append([])
+                    continue
+
+                depth -= 1
+                if tag == W_T and paragraphs:
+                    if elem.text:
+                        after_hard_break = False
+                    if paragraphs[-1][2] is None:
+                        paragraphs[-1][2] = page
+                    paragraphs[-1][0].append(elem.text or "")
+                elif tag == W_TAB and paragraphs:
+                    paragraphs[-1][0].append("\t")
+                elif tag in (W_BR, W_CR) and paragraphs:
+                    if elem.get(W_TYPE) == "page":
+                        page += 1
+                        after_hard_break = True
+                    else:
+                        paragraphs[-1][0].append("\n")
+                elif tag == W_RENDERED_BREAK:
+                    if after_hard_break:
+                        after_hard_break = False
+                    else:
+                        page += 1
+                elif tag == W_P_STYLE and paragraphs:
+                    paragraphs[-1][1] = elem.get(W_VAL)
+                elif tag == W_P and paragraphs:
+                    parts, style, first_page = paragraphs.pop()
+                    text = "".join(parts).strip()
+                    if text:
+                        if tables and tables[-1] and tables[-1][-1]:
+                            tables[-1][-1][-1].append(text)
+                        elif style in headings:
+                            section = text
+                            yield first_page or page, section, "#" * headings[style] + " " + text
+                        else:
+                            yield first_page or page, section, text
+                elif tag == W_TBL and tables:
+                    rows = [" | ".join(" ".join(cell) for cell in row) for row in tables.pop()]
+                    text = "\n".join(row for row in rows if row.strip(" |"))
+                    if text:
+                        if tables and tables[-1] and tables[-1][-1]:
+                            tables[-1][-1][-1].append(text)  # nested table: part of the outer cell
+                        else:
+                            yield page, section, text
+
+                # Drop each top-level block once it has been read
+                if depth == 2 and body is not None:
+                    body.clear()
+
+def extract_pages_from_docx(docx_path):
+    """Returns a list of (page_number, text), or [(None, text)] if the file records no page breaks."""
+    pages = []
+    try:
+        for page, _, text in iter_docx_blocks(docx_path):
+            if not pages or pages[-1][0] != page:
+                pages.append((page, []))
+            pages[-1][1].append(text)
+    except (zipfile.BadZipFile, KeyError, ET.ParseError, OSError) as e:
+        print(f"Error reading DOCX {docx_path}: {e}")
+        return None
+    pages = [(page, "\n".join(blocks) + "\n") for page, blocks in pages]
+    if len(pages) == 1:
+        return [(None, pages[0][1])]
+    return pages
 
 def extract_text_from_docx(docx_path):
-    text = ""
+    pages = extract_pages_from_docx(docx_path)
+    if pages is None:
+        return None
+    return "".join(text for _, text in pages)
+
+def iter_text_blocks(txt_path, block_size=65536):
+    """Yields (None, None, text) blocks of about `block_size` characters, split at line ends."""
+    with open(txt_path, "r", encoding="utf-8") as f:
+        carry = ""
+        while True:
+            chunk = f.read(block_size)
+            if not chunk:
+                break
+            chunk = carry + chunk
+            cut = chunk.rfind("\n")
+            if cut < 0:
+                carry = chunk
+                continue
+            carry = chunk[cut + 1:]
+            yield None, None, chunk[:cut]
+        if carry:
+            yield None, None, carry
+
+READERS = {".pdf": iter_pdf_pages, ".docx": iter_docx_blocks, ".txt": iter_text_blocks}
+
+class ReadAgain(Exception):
+    """
+    Raised by Lease.take when another reader is already waiting for memory:
+    the caller gives this read's share back with lease.read_again() and reads
+    the document again from the start.
+    """
+
+class MemoryCeiling:
+    """
+    Upper bound on the extracted text (and the indexes built from it) the
+    whole run holds at once (config.READ_MEMORY_LIMIT_MB; 0 or None for no
+    limit). Each document draws on a lease, which is given back with
+    lease.close() once the caller has dropped the text.
+
+    Documents read concurrently while their text fits. A reader that would go
+    over the ceiling waits until other documents give their share back; a
+    document is only cut short when it alone exceeds the ceiling, so what gets
+    read never depends on what else is in flight.
+    Only one reader waits at a time. Another reader that runs out of room
+    while it waits gives back what it has read so far and starts over once
+    the waiter is through, so the waiter only depends on memory that is
+    certain to be released, and waiting cannot deadlock.
+    """
+
+    def __init__(self, limit_mb=None):
+        self.limit = limit_mb * 1024 * 1024 if limit_mb else None
+        self.used = 0
+        self.changed = threading.Condition()
+        self.waiter = threading.Lock()
+
+    def lease(self):
+        return Lease(self)
+
+    def _reserve(self, lease, size):
+        self.used += size
+        lease.held += size
+        lease.this_read += size
+
+    def _take(self, lease, size):
+        with self.changed:
+            if self.limit is None or self.used + size <= self.limit:
+                self._reserve(lease, size)
+                return True
+        if not lease.waiting:
+            if lease.this_read and not self.waiter.acquire(blocking=False):
+                raise ReadAgain()
+            if not lease.this_read:
+                self.waiter.acquire()  # nothing read yet, so nothing to give back: queue up
+            lease.waiting = True
+        with self.changed:
+            while self.used + size > self.limit:
+                if self.used == lease.held:
+                    return False  # nothing left to wait for: this document alone is too big
+                self.changed.wait()
+            self._reserve(lease, size)
+            return True
+
+    def _charge(self, lease, size):
+        with self.changed:
+            self.used += size
+            lease.held += size
+
+    def _read_again(self, lease):
+        with self.changed:
+            self.used -= lease.this_read
+            lease.held -= lease.this_read
+            lease.this_read = 0
+            self.changed.notify_all()
+        # The second attempt waits its turn, so it cannot be sent back again
+        self.waiter.acquire()
+        lease.waiting = True
+
+    def _done_reading(self, lease):
+        lease.this_read = 0
+        if lease.waiting:
+            lease.waiting = False
+            self.waiter.release()
+
+    def _give_back(self, lease):
+        self._done_reading(lease)
+        with self.changed:
+            self.used -= lease.held
+            lease.held = 0
+            self.changed.notify_all()
+
+class Lease:
+    """
+    The share of a MemoryCeiling held by one document (or, in comparison
+    mode, one group of documents read together).
+    """
+
+    def __init__(self, ceiling):
+        self.ceiling = ceiling
+        self.held = 0
+        self.this_read = 0  # taken by the document being read now
+        self.waiting = False  # holds the ceiling's single waiter slot
+
+    def take(self, text):
+        """
+        Accounts for `text` while reading, waiting for other documents to give
+        memory back if needed; False if this lease alone would go over the
+        ceiling. Raises ReadAgain if another reader is already waiting.
+        """
+        return self.ceiling._take(self, sys.getsizeof(text))
+
+    def charge(self, nbytes):
+        """Accounts for memory built from the text (a copy, an index); never waits."""
+        self.ceiling._charge(self, nbytes)
+
+    def read_again(self):
+        """After ReadAgain: gives back this read's text and waits for this lease's turn."""
+        self.ceiling._read_again(self)
+
+    def done_reading(self):
+        """Ends the current read (called by read_file_pages) and lets the next waiter in."""
+        self.ceiling._done_reading(self)
+
+    def close(self):
+        self.ceiling._give_back(self)
+
+def iter_file(file_path, max_chars=None, max_tokens=None, lease=None):
+    """
+    Yields a document's (page, section, text) segments lazily: pages for PDF,
+    paragraphs and tables for DOCX, line-aligned blocks for TXT. Empty
+    segments are skipped.
+    Reading stops after `max_chars` characters or `max_tokens` tokens
+    (whitespace-separated words), cutting the last segment short, or when
+    `lease` (see MemoryCeiling) refuses more text because this document alone
+    would exceed the ceiling. Read errors and ReadAgain are raised.
+
+        for page, section, text in iter_file(path, max_chars=15000):
+            ...
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+    reader = READERS.get(ext)
+    if reader is None:
+        raise ValueError(f"Unsupported file type: {ext}")
+    chars = tokens = 0
+    segments = reader(file_path)
     try:
-        doc = docx.Document(docx_path)
-        for para in doc.paragraphs:
-            text += para.text + "\n"
+        for page, section, text in segments:
+            if not text.strip():
+                continue
+            if max_chars is not None and chars + len(text) > max_chars:
+                text = text[:max_chars - chars]
+            if max_tokens is not None:
+                words = text.split()
+                if tokens + len(words) > max_tokens:
+                    text = " ".join(words[:max_tokens - tokens])
+                tokens += min(len(words), max_tokens - tokens)
+            chars += len(text)
+            if lease is not None and not lease.take(text):
+                print(f"  - {os.path.basename(file_path)}: larger than the memory ceiling, "
+                      f"reading stops after {chars - len(text)} characters (READ_MEMORY_LIMIT_MB).")
+                return
+            if text:
+                yield page, section, text
+            if (max_chars is not None and chars >= max_chars) or (max_tokens is not None and tokens >= max_tokens):
+                return
+    finally:
+        segments.close()  # release the open file now, not when the generator is collected
+
+def read_file_pages(file_path, max_chars=None, max_tokens=None, lease=None):
+    """
+    Like read_file, but keeps page boundaries: a list of (page_number, text).
+    Formats without pages (TXT, DOCX saved without page breaks) return a single (None, text) entry.
+    Limits are as for iter_file; a read sent back by the lease is started over.
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext not in READERS:
+        print(f"Unsupported file type: {ext}")
+        return None
+    try:
+        while True:
+            try:
+                pages = _read_pages(file_path, max_chars, max_tokens, lease)
+                break
+            except ReadAgain:
+                lease.read_again()
     except Exception as e:
-        print(f"Error reading DOCX {docx_path}: {e}")
+        print(f"Error reading {file_path}: {e}")
         return None
-    return text
+    finally:
+        if lease is not None:
+            lease.done_reading()
+    if ext == ".docx" and len(pages) == 1:
+        return [(None, pages[0][1])]
+    return pages
+
+def _read_pages(file_path, max_chars, max_tokens, lease):
+    # Each page is joined as soon as the next one starts, so the segments and
+    # their joined copy only coexist for one page
+    pages = []
+    blocks = []
+    current = None
+    for page, _, text in iter_file(file_path, max_chars, max_tokens, lease):
+        if blocks and page != current:
+            pages.append((current, "\n".join(blocks) + "\n"))
+            blocks = []
+        current = page
+        blocks.append(text)
+    if blocks:
+        pages.append((current, "\n".join(blocks) + "\n"))
+    return pages
 
 def read_file(file_path):
     ext = os.path.splitext(file_path)[1].lower()
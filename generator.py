@@ -1,31 +1,54 @@
-import google.generativeai as genai
-import requests
+import asyncio
 import config
 import json
+import re
 import time
+import threading
 import warnings
 
+import deadline
+import providers
+import json_codec
+
 # Suppress the annoying deprecation warning from google.generativeai
 warnings.filterwarnings("ignore", category=FutureWarning)
 
-# Configure Gemini
-genai.configure(api_key=config.GOOGLE_API_KEY)
-
 # Model configurations
 MODEL_NAME = "gemini-2.0-flash-lite-001"
 MISTRAL_MODEL = "mistral-large-latest"
 GROQ_MODEL = "llama-3.3-70b-versatile"  # Fast and good quality
 OPENROUTER_MODEL = "google/gemini-2.0-flash-lite-001:free"
 
+# Document text sent to the generator: 40,000 chars is roughly 10k tokens, which
+# keeps free-tier TPM limits safe; comparison prompts take less per file to fit several
+DOCUMENT_CHARS = 40000
+COMPARISON_CHARS = 15000
+
 # Global variable to track which provider is working
 ACTIVE_PROVIDER = None  # Will be set to "gemini", "mistral", "groq", or "openrouter"
+PROVIDER_LOCK = threading.Lock()
+
+# Model label used for Sheets table names, per provider
+PROVIDER_LABELS = {
+    "gemini": "gemini-2.0-flash",
+    "mistral": "mistral-large",
+    "groq": "llama-3.3-70b",
+    "openrouter": "gemini-free"
+}
+
+def set_provider(provider):
+    """Use `provider` for the whole session without probing the others (e.g. from --provider)."""
+    global ACTIVE_PROVIDER
+    import sheets_uploader
+    ACTIVE_PROVIDER = provider
+    sheets_uploader.set_active_model(PROVIDER_LABELS[provider])
 
 def test_gemini_availability():
     """Test if Gemini is available and has quota."""
     try:
-        model = genai.GenerativeModel(MODEL_NAME)
         # Try a minimal request to check quota
-        response = model.generate_content("Say OK")
+        with deadline.scope(providers.LLM_CONNECT_TIMEOUT * 3):
+            providers.generate_sync("gemini", "Say OK")
         return True
     except Exception as e:
         if "429" in str(e) or "quota" in str(e).lower():
@@ -36,6 +59,14 @@ def test_gemini_availability():
 
 def determine_active_provider():
     """Determine which provider to use for the entire session."""
+    if ACTIVE_PROVIDER is not None:
+        return ACTIVE_PROVIDER
+    
+    # Pipeline stages call this from several threads; only one should probe providers
+    with PROVIDER_LOCK:
+        return _probe_providers()
+
+def _probe_providers():
     global ACTIVE_PROVIDER
     
     if ACTIVE_PROVIDER is not None:
@@ -47,7 +78,7 @@ def determine_active_provider():
     import sheets_uploader
     
     # 1. Test Gemini first (Best quality)
-    if test_gemini_availability():
+    if config.GOOGLE_API_KEY and test_gemini_availability():
         print("  [Init] Using Gemini for this session.")
         ACTIVE_PROVIDER = "gemini"
         sheets_uploader.set_active_model("gemini-2.0-flash")
@@ -92,6 +123,34 @@ def determine_active_provider():
     sheets_uploader.set_active_model("gemini-2.0-flash")
     return ACTIVE_PROVIDER
 
+def _generate_with(name, label, prompt, is_json):
+    """Blocking call to one chat-completions backend; prints the error and returns None on failure."""
+    try:
+        return providers.generate_sync(name, prompt, json=is_json)
+    except Exception as e:
+        print(f"  [{label} Error] {e or type(e).__name__}")
+        response = getattr(e, "response", None)
+        if name == "openrouter" and response is not None:
+            print(f"  [{label} Response] {response.text}")
+        return None
+
+# Display names used in error messages
+PROVIDER_NAMES = {"gemini": "Gemini", "mistral": "Mistral", "groq": "Groq", "openrouter": "OpenRouter"}
+
+async def _generate_async(name, label, prompt, timeout):
+    """_generate_with() for coroutines on providers.loop(); also checks the API key."""
+    if name != "gemini" and not getattr(config, f"{name.upper()}_API_KEY", None):
+        print(f"  [{label}] No API Key found.")
+        return None
+    try:
+        return await providers.generate(name, prompt, timeout=timeout)
+    except Exception as e:
+        print(f"  [{label} Error] {e or type(e).__name__}")
+        response = getattr(e, "response", None)
+        if name == "openrouter" and response is not None:
+            print(f"  [{label} Response] {response.text}")
+        return None
+
 def generate_with_openrouter(prompt, is_json=False):
     """
     Fallback function to generate content using OpenRouter API.
@@ -99,36 +158,7 @@ def generate_with_openrouter(prompt, is_json=False):
     if not config.OPENROUTER_API_KEY:
         print("  [OpenRouter] No API Key found.")
         return None
-
-    url = "https://openrouter.ai/api/v1/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {config.OPENROUTER_API_KEY}",
-        "Content-Type": "application/json",
-        "HTTP-Referer": "https://rag-evaluator.local", # OpenRouter requirement
-        "X-Title": "RAG Evaluator Script"
-    }
-    
-    messages = [{"role": "user", "content": prompt}]
-    
-    payload = {
-        "model": OPENROUTER_MODEL,
-        "messages": messages,
-        "temperature": 0.2
-    }
-    
-    if is_json:
-        payload["response_format"] = {"type": "json_object"}
-
-    try:
-        response = requests.post(url, json=payload, headers=headers)
-        response.raise_for_status()
-        data = response.json()
-        return data['choices'][0]['message']['content']
-    except Exception as e:
-        print(f"  [OpenRouter Error] {e}")
-        if hasattr(e, 'response') and e.response:
-             print(f"  [OpenRouter Response] {e.response.text}")
-        return None
+    return _generate_with("openrouter", "OpenRouter", prompt, is_json)
 
 def generate_with_mistral(prompt, is_json=False):
     """
@@ -137,32 +167,7 @@ def generate_with_mistral(prompt, is_json=False):
     if not config.MISTRAL_API_KEY:
         print("  [Mistral] No API Key found.")
         return None
-
-    url = "https://api.mistral.ai/v1/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {config.MISTRAL_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    
-    messages = [{"role": "user", "content": prompt}]
-    
-    payload = {
-        "model": MISTRAL_MODEL,
-        "messages": messages,
-        "temperature": 0.2
-    }
-    
-    if is_json:
-        payload["response_format"] = {"type": "json_object"}
-
-    try:
-        response = requests.post(url, json=payload, headers=headers)
-        response.raise_for_status()
-        data = response.json()
-        return data['choices'][0]['message']['content']
-    except Exception as e:
-        print(f"  [Mistral Error] {e}")
-        return None
+    return _generate_with("mistral", "Mistral", prompt, is_json)
 
 def generate_with_groq(prompt, is_json=False):
     """
@@ -171,140 +176,199 @@ def generate_with_groq(prompt, is_json=False):
     if not config.GROQ_API_KEY:
         print("  [Groq] No API Key found.")
         return None
+    return _generate_with("groq", "Groq", prompt, is_json)
 
-    url = "https://api.groq.com/openai/v1/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {config.GROQ_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    
-    messages = [{"role": "user", "content": prompt}]
-    
-    payload = {
-        "model": GROQ_MODEL,
-        "messages": messages,
-        "temperature": 0.2
-    }
-    
-    if is_json:
-        payload["response_format"] = {"type": "json_object"}
-
-    try:
-        response = requests.post(url, json=payload, headers=headers)
-        response.raise_for_status()
-        data = response.json()
-        return data['choices'][0]['message']['content']
-    except Exception as e:
-        print(f"  [Groq Error] {e}")
-        return None
-
-def generate_test_cases(file_name, file_text, num_questions=10):
+def generate_json_text(prompt, provider):
     """
-    Sends file text to LLM and asks for JSON formatted Q&A pairs.
+    Sends a JSON-mode prompt to the active provider and returns the raw text (or None).
     """
-    # Determine which provider to use
-    provider = determine_active_provider()
-    
-    # Drastically reduce context to avoid hitting TPM (Tokens Per Minute) limits on Free Tier
-    # 40,000 chars is roughly 10k tokens, which is safer.
-    truncated_text = file_text[:40000]
-    
-    prompt = f"""
-    You are an expert QA generator for RAG systems.
-    
-    I have a document named "{file_name}".
-    Generate ONLY {num_questions} high-quality test questions to EFFECTIVELY STRESS-TEST a RAG system.
-    
-    CRITICAL REQUIREMENTS:
-    
-    1. **Include Document-Specific Keywords**: Since the RAG system contains MULTIPLE documents, questions MUST include:
-       - Specific entities, names, or terms from THIS document (e.g., company names, product names, dates, metrics)
-       - Context clues that help the RAG system identify the correct source document
-       - Example: Instead of "What was the revenue?", ask "What was Zensar's revenue in Q1 FY24?"
-    
-    2. **Question Type Mix** (to thoroughly test the system):
-       - **Straightforward Questions (30%)**: Direct facts clearly stated in the document
-       - **Inference Questions (30%)**: Require reasoning or combining multiple pieces of information
-       - **Edge Cases (20%)**: 
-         * Questions about specific details that might be easy to miss
-         * Questions requiring precise numeric values
-         * Questions about comparisons or trends
-       - **Challenging Questions (20%)**: 
-         * Questions that are SLIGHTLY outside the document scope (but related)
-         * Questions that require context the document might not fully provide
-         * These should result in "Not Answered" or partial answers from the RAG
-    
-    3. **Diversity**: Ensure questions cover different sections/topics within the document
-    
-    For each question, provide:
-    1. The Question itself (with appropriate keywords/context)
-    2. The Expected Answer (Gold Standard) - if the info is NOT in the document, say "Not in document"
-    3. The Page Number or Section Name (if available)
-    4. The exact Quote from the text (if available)
-    
-    Output MUST be valid JSON. Format:
-    [
-        {{
-            "question": "...",
-            "expected_answer": "...",
-            "metadata": {{
-                "page": "...",
-                "section": "...",
-                "quote": "..."
-            }}
-        }}
-    ]
-    
-    Document Text:
-    {truncated_text} 
-    """ 
-    # Truncate to 300k chars just to be safe, though Flash supports 1M.
-
-    # Use the active provider directly
     if provider == "gemini":
         try:
-            model = genai.GenerativeModel(MODEL_NAME)
-            response = model.generate_content(prompt, generation_config={"response_mime_type": "application/json"})
-            text = response.text.strip()
-            if text.startswith("```json"): text = text[7:-3]
-            elif text.startswith("```"): text = text[3:-3]
-            return json.loads(text)
+            return providers.generate_sync("gemini", prompt, json=True)
         except Exception as e:
             print(f"  [Gemini Error] {e}")
-            return []
+            return None
     
     elif provider == "mistral":
-        mistral_text = generate_with_mistral(prompt, is_json=True)
-        if mistral_text:
-            try:
-                return json.loads(mistral_text)
-            except json.JSONDecodeError:
-                print("  [Mistral] Failed to decode JSON.")
-                return []
-        return []
+        return generate_with_mistral(prompt, is_json=True)
     
     elif provider == "groq":
-        groq_text = generate_with_groq(prompt, is_json=True)
-        if groq_text:
-            try:
-                return json.loads(groq_text)
-            except json.JSONDecodeError:
-                print("  [Groq] Failed to decode JSON.")
-                return []
-        return []
+        return generate_with_groq(prompt, is_json=True)
     
     elif provider == "openrouter":
-        or_text = generate_with_openrouter(prompt, is_json=True)
-        if or_text:
+        return generate_with_openrouter(prompt, is_json=True)
+    
+    print("  [Error] No provider available.")
+    return None
+
+def strip_code_fences(text):
+    """Removes a ```json ... ``` wrapper, tolerating trailing whitespace and a missing closing fence."""
+    text = text.strip()
+    match = re.match(r"^```[A-Za-z]*\s*(.*?)\s*```$", text, re.S)
+    if match:
+        return match.group(1)
+    if text.startswith("```"):
+        # Truncated output: opening fence but no closing one
+        return re.sub(r"^```[A-Za-z]*\s*", "", text)
+    return text
+
+def is_test_case(obj):
+    return isinstance(obj, dict) and "question" in obj and "expected_answer" in obj
+
+def _cases_from(data):
+    """Finds the Q&A list in a fully parsed response ([...], {"questions": [...]} or a single object)."""
+    if isinstance(data, list):
+        return [c for c in data if is_test_case(c)]
+    if is_test_case(data):
+        return [data]
+    if isinstance(data, dict):
+        for value in data.values():
+            if isinstance(value, list):
+                cases = [c for c in value if is_test_case(c)]
+                if cases:
+                    return cases
+    return []
+
+def salvage_json_cases(text):
+    """
+    Parses LLM output into Q&A objects, recovering every complete object from
+    truncated or otherwise invalid JSON.
+    Returns (cases, complete) where complete is False if anything had to be salvaged.
+    """
+    if not text:
+        return [], False
+    text = strip_code_fences(text)
+    
+    try:
+        return _cases_from(json_codec.loads(text)), True
+    except json.JSONDecodeError:
+        pass
+    
+    # Single pass over the text tracking strings and brace depth. Every object that
+    # closes is tried as a Q&A pair; inner objects (metadata) close first and are
+    # rejected, then the enclosing Q&A object is accepted. Unclosed objects are dropped.
+    cases = []
+    starts = []
+    in_string = False
+    escaped = False
+    for i, ch in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == "{":
+            starts.append(i)
+        elif ch == "}" and starts:
+            start = starts.pop()
             try:
-                return json.loads(or_text)
+                obj = json_codec.loads(text[start:i + 1])
             except json.JSONDecodeError:
-                print("  [OpenRouter] Failed to decode JSON.")
-                return []
+                continue
+            if is_test_case(obj):
+                cases.append(obj)
+    return cases, False
+
+def exclusion_note(exclude):
+    """Prompt fragment listing questions a follow-up call must not repeat."""
+    if not exclude:
+        return ""
+    listed = "\n".join(f"    - {q}" for q in exclude)
+    return f"Do NOT repeat any of these already generated questions:\n{listed}\n"
+
+def generate_cases(build_prompt, num_questions, provider):
+    """
+    Runs a generation prompt and salvages complete Q&A objects from the output.
+    If fewer than num_questions came back (truncation, bad JSON, short answer),
+    makes one follow-up call asking only for the missing count.
+    """
+    text = generate_json_text(build_prompt(num_questions, []), provider)
+    if not text:
         return []
     
-    print("  [Error] No provider available.")
-    return []
+    cases, complete = salvage_json_cases(text)
+    if not complete:
+        print(f"  [JSON] Output was incomplete; salvaged {len(cases)} complete question(s).")
+    
+    missing = num_questions - len(cases)
+    if missing > 0:
+        print(f"  [JSON] Requesting {missing} missing question(s)...")
+        seen = {c["question"] for c in cases}
+        extra_text = generate_json_text(build_prompt(missing, sorted(seen)), provider)
+        extra, _ = salvage_json_cases(extra_text)
+        cases += [c for c in extra if c["question"] not in seen][:missing]
+    
+    return cases[:num_questions]
+
+def generate_test_cases(file_name, file_text, num_questions=10):
+    """
+    Sends file text to LLM and asks for JSON formatted Q&A pairs.
+    """
+    # Determine which provider to use
+    provider = determine_active_provider()
+    
+    # Drastically reduce context to avoid hitting TPM (Tokens Per Minute) limits on Free Tier
+    truncated_text = file_text[:DOCUMENT_CHARS]
+    
+    def build_prompt(count, exclude):
+        return f"""
+        You are an expert QA generator for RAG systems.
+    
+        I have a document named "{file_name}".
+        Generate ONLY {count} high-quality test questions to EFFECTIVELY STRESS-TEST a RAG system.
+    
+        CRITICAL REQUIREMENTS:
+    
+        1. **Include Document-Specific Keywords**: Since the RAG system contains MULTIPLE documents, questions MUST include:
+           - Specific entities, names, or terms from THIS document (e.g., company names, product names, dates, metrics)
+           - Context clues that help the RAG system identify the correct source document
+           - Example: Instead of "What was the revenue?", ask "What was Zensar's revenue in Q1 FY24?"
+    
+        2. **Question Type Mix** (to thoroughly test the system):
+           - **Straightforward Questions (30%)**: Direct facts clearly stated in the document
+           - **Inference Questions (30%)**: Require reasoning or combining multiple pieces of information
+           - **Edge Cases (20%)**: 
+             * Questions about specific details that might be easy to miss
+             * Questions requiring precise numeric values
+             * Questions about comparisons or trends
+           - **Challenging Questions (20%)**: 
+             * Questions that are SLIGHTLY outside the document scope (but related)
+             * Questions that require context the document might not fully provide
+             * These should result in "Not Answered" or partial answers from the RAG
+    
+        3. **Diversity**: Ensure questions cover different sections/topics within the document
+    
+        For each question, provide:
+        1. The Question itself (with appropriate keywords/context)
+        2. The Expected Answer (Gold Standard) - if the info is NOT in the document, say "Not in document"
+        3. The Page Number or Section Name (if available)
+        4. The exact Quote from the text (if available)
+    
+        {exclusion_note(exclude)}
+        Output MUST be valid JSON. Format:
+        [
+            {{
+                "question": "...",
+                "expected_answer": "...",
+                "metadata": {{
+                    "page": "...",
+                    "section": "...",
+                    "quote": "...",
+                    "question_type": "straightforward|inference|edge_case|challenging"
+                }}
+            }}
+        ]
+    
+        Document Text:
+        {truncated_text} 
+        """ 
+    # Truncate to 300k chars just to be safe, though Flash supports 1M.
+
+    return generate_cases(build_prompt, num_questions, provider)
 
 def generate_comparison_test_cases(files_data, num_questions=10):
     """
@@ -316,108 +380,67 @@ def generate_comparison_test_cases(files_data, num_questions=10):
     # Build a combined context with file summaries
     file_summaries = []
     for file_info in files_data:
-        truncated = file_info['text'][:15000]  # Shorter per-file to fit multiple
+        truncated = file_info['text'][:COMPARISON_CHARS]  # Shorter per-file to fit multiple
         file_summaries.append(f"--- Document: {file_info['filename']} ---\n{truncated}\n")
     
     combined_text = "\n".join(file_summaries)
     
-    prompt = f"""
-    You are an expert QA generator for RAG systems.
-    
-    You have {len(files_data)} documents. Generate {num_questions} COMPARISON questions to test a RAG system's ability to compare information across documents.
-    
-    Documents:
-    {combined_text}
-    
-    CRITICAL REQUIREMENTS:
-    
-    1. **Comparison Questions Only**: Every question MUST compare or relate information from MULTIPLE documents/entities.
-       - Example: "Compare [Entity A]'s revenue in Q1 vs [Entity B]'s revenue in Q1"
-       - Example: "Which company had higher growth rate?"
-       - Example: "What is the difference between [Entity A] and [Entity B] in terms of [metric]?"
-    
-    2. **Diverse Question Types**:
-       - Direct comparisons (30%): "What was the difference between X and Y?"
-       - Ranking questions (30%): "Which entity had the highest/lowest [metric]?"
-       - Trend comparisons (20%): "Compare the trends of X vs Y"
-       - Challenging cross-doc queries (20%): Require synthesizing info that might not be directly comparable
-    
-    3. **Clear Entity Names**: Include specific entity names (companies, products, time periods) from the documents
-    
-    For each question, provide:
-    1. The Question (must reference multiple entities/documents)
-    2. The Expected Answer - compare/synthesize from all relevant documents
-    3. Metadata with doc references and page/section info where the comparison data is found
-    
-    Output MUST be valid JSON:
-    [
-        {{
-            "question": "...",
-            "expected_answer": "...",
-            "metadata": {{
-                "documents": ["file1.pdf", "file2.pdf"],
-                "comparison_type": "numeric|qualitative|ranking",
-                "page": "page numbers from source docs (if available)",
-                "section": "section names from source docs (if available)",
-                "quote": "..."
+    def build_prompt(count, exclude):
+        return f"""
+        You are an expert QA generator for RAG systems.
+    
+        You have {len(files_data)} documents. Generate {count} COMPARISON questions to test a RAG system's ability to compare information across documents.
+    
+        Documents:
+        {combined_text}
+    
+        CRITICAL REQUIREMENTS:
+    
+        1. **Comparison Questions Only**: Every question MUST compare or relate information from MULTIPLE documents/entities.
+           - Example: "Compare [Entity A]'s revenue in Q1 vs [Entity B]'s revenue in Q1"
+           - Example: "Which company had higher growth rate?"
+           - Example: "What is the difference between [Entity A] and [Entity B] in terms of [metric]?"
+    
+        2. **Diverse Question Types**:
+           - Direct comparisons (30%): "What was the difference between X and Y?"
+           - Ranking questions (30%): "Which entity had the highest/lowest [metric]?"
+           - Trend comparisons (20%): "Compare the trends of X vs Y"
+           - Challenging cross-doc queries (20%): Require synthesizing info that might not be directly comparable
+    
+        3. **Clear Entity Names**: Include specific entity names (companies, products, time periods) from the documents
+    
+        For each question, provide:
+        1. The Question (must reference multiple entities/documents)
+        2. The Expected Answer - compare/synthesize from all relevant documents
+        3. Metadata with doc references and page/section info where the comparison data is found
+    
+        {exclusion_note(exclude)}
+        Output MUST be valid JSON:
+        [
+            {{
+                "question": "...",
+                "expected_answer": "...",
+                "metadata": {{
+                    "documents": ["file1.pdf", "file2.pdf"],
+                    "comparison_type": "numeric|qualitative|ranking",
+                    "page": "page numbers from source docs (if available)",
+                    "section": "section names from source docs (if available)",
+                    "quote": "..."
+                }}
             }}
-        }}
-    ]
-    """
-    
-    # Use active provider
-    if provider == "gemini":
-        try:
-            model = genai.GenerativeModel(MODEL_NAME)
-            response = model.generate_content(prompt, generation_config={"response_mime_type": "application/json"})
-            text = response.text.strip()
-            if text.startswith("```json"): text = text[7:-3]
-            elif text.startswith("```"): text = text[3:-3]
-            return json.loads(text)
-        except Exception as e:
-            print(f"  [Gemini Error] {e}")
-            return []
-    
-    elif provider == "mistral":
-        mistral_text = generate_with_mistral(prompt, is_json=True)
-        if mistral_text:
-            try:
-                return json.loads(mistral_text)
-            except json.JSONDecodeError:
-                print("  [Mistral] Failed to decode JSON.")
-                return []
-        return []
-    
-    elif provider == "groq":
-        groq_text = generate_with_groq(prompt, is_json=True)
-        if groq_text:
-            try:
-                return json.loads(groq_text)
-            except json.JSONDecodeError:
-                print("  [Groq] Failed to decode JSON.")
-                return []
-        return []
-    
-    elif provider == "openrouter":
-        or_text = generate_with_openrouter(prompt, is_json=True)
-        if or_text:
-            try:
-                return json.loads(or_text)
-            except json.JSONDecodeError:
-                print("  [OpenRouter] Failed to decode JSON.")
-                return []
-        return []
-    
-    print("  [Error] No provider available for comparison questions.")
-    return []
+        ]
+        """
+
+    return generate_cases(build_prompt, num_questions, provider)
 
-def evaluate_rag_response(question, expected_answer, rag_response):
+async def evaluate_rag_response(question, expected_answer, rag_response, timeout=None):
     """
     Evaluates the RAG response against the expected answer using an LLM.
     Returns a status string: "Fully Correct", "Partially Correct", "Wrongly Answered", or "Not Answered".
+    A coroutine for providers.loop(); `timeout` caps the provider call (seconds).
     """
-    # Use the same provider as question generation
-    provider = ACTIVE_PROVIDER or determine_active_provider()
+    # Use the same provider as question generation (probing blocks, so it runs off the loop)
+    provider = ACTIVE_PROVIDER or await asyncio.to_thread(determine_active_provider)
     
     prompt = f"""
     You are an expert judge for a RAG system.
@@ -448,36 +471,10 @@ def evaluate_rag_response(question, expected_answer, rag_response):
         if "not answered" in text: return "not answered"
         return None
 
-    # Use the active provider
-    if provider == "gemini":
-        try:
-            model = genai.GenerativeModel(MODEL_NAME)
-            response = model.generate_content(prompt)
-            status = parse_status(response.text)
-            if status: return status
-        except Exception as e:
-            print(f"  [Gemini Error] {e}")
-            return "Error"
-    
-    elif provider == "mistral":
-        mistral_text = generate_with_mistral(prompt)
-        status = parse_status(mistral_text)
-        if status: return status
-        return "Error"
-
-    elif provider == "groq":
-        groq_text = generate_with_groq(prompt)
-        status = parse_status(groq_text)
-        if status: return status
-        return "Error"
-
-    elif provider == "openrouter":
-        or_text = generate_with_openrouter(prompt)
-        status = parse_status(or_text)
-        if status: return status
-        return "Error"
-    
-    return "Error (No Provider)"
+    if provider not in PROVIDER_NAMES:
+        return "Error (No Provider)"
+    status = parse_status(await _generate_async(provider, PROVIDER_NAMES[provider], prompt, timeout))
+    return status or "Error"
 
 if __name__ == "__main__":
     # Test stub
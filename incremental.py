@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+
+import deadline
+
+# Labels written to the "Change" column of the merged report
+CHANGE_NEW = "New"
+CHANGE_DOC = "New (document changed)"
+CHANGE_RESPONSE = "Response Changed"
+CHANGE_NONE = "Unchanged"
+
+def fingerprint_file(file_path):
+    """Returns the SHA-256 of the file's bytes (read in 1 MB chunks)."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def fingerprint_group(file_paths):
+    """Combined fingerprint for a set of documents (used by comparison mode)."""
+    digest = hashlib.sha256()
+    for path in sorted(file_paths, key=os.path.basename):
+        digest.update(os.path.basename(path).encode("utf-8"))
+        digest.update(fingerprint_file(path).encode("ascii"))
+    return digest.hexdigest()
+
+class Manifest:
+    """
+    Previous run's state, keyed by document (or comparison group) name:
+        {"documents": {key: {"fingerprint", "num_questions", "cases", "results"}}}
+    `results` maps question text -> {"response", "status"} so unchanged RAG
+    responses can reuse their verdict instead of being judged again.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.previous = {}
+        self.current = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.previous = json.load(f).get("documents", {})
+            except (ValueError, OSError) as e:
+                print(f"  [Incremental] Could not read manifest {path}: {e}. Running full.")
+                self.previous = {}
+
+    def document_state(self, key, fingerprint):
+        """Returns CHANGE_NEW, CHANGE_DOC or CHANGE_NONE for the document."""
+        entry = self.previous.get(key)
+        if entry is None:
+            return CHANGE_NEW
+        if entry.get("fingerprint") != fingerprint:
+            return CHANGE_DOC
+        return CHANGE_NONE
+
+    def cached_cases(self, key, fingerprint, num_questions):
+        """Question set from the previous run, or None if it must be regenerated."""
+        entry = self.previous.get(key)
+        if not entry or entry.get("fingerprint") != fingerprint:
+            return None
+        if entry.get("num_questions") != num_questions or not entry.get("cases"):
+            return None
+        return entry["cases"]
+
+    def previous_result(self, key, fingerprint, question):
+        """Previous {"response", "status"} for a question on an unchanged document."""
+        entry = self.previous.get(key)
+        if not entry or entry.get("fingerprint") != fingerprint:
+            return None
+        return entry.get("results", {}).get(question)
+
+    def reusable_status(self, previous, rag_actual):
+        """Previous verdict if the RAG response text is identical and was judged cleanly."""
+        if not previous or previous.get("response") != rag_actual:
+            return None
+        status = previous.get("status")
+        if not status or str(status).startswith("Error") or status == deadline.TIMED_OUT:
+            return None
+        return status
+
+    def classify(self, doc_state, previous, rag_actual):
+        """Value for the "Change" column of one result row."""
+        if doc_state != CHANGE_NONE:
+            return doc_state
+        if previous is None:
+            return CHANGE_NEW
+        if previous.get("response") != rag_actual:
+            return CHANGE_RESPONSE
+        return CHANGE_NONE
+
+    def record(self, key, fingerprint, num_questions, cases, rows):
+        """Stores this run's cases and verdicts for `key`."""
+        self.current[key] = {
+            "fingerprint": fingerprint,
+            "num_questions": num_questions,
+            "cases": cases,
+            "results": {
+                row["Question"]: {"response": row["RAG Response"], "status": row["Status"]}
+                for row in rows
+            }
+        }
+
+    def save(self):
+        """Writes the manifest, keeping entries for documents not selected this run."""
+        documents = dict(self.previous)
+        documents.update(self.current)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"documents": documents}, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+        print(f"  [Incremental] Manifest saved to {self.path}")
@@ -0,0 +1,202 @@
+import codecs
+import gzip
+import json
+import re
+import threading
+
+import config
+
+try:
+    import orjson
+except ImportError:  # stdlib json is the fallback
+    orjson = None
+
+# Gzip request bodies of at least COMPRESS_MIN_BYTES (RAG queries, LLM prompts)
+COMPRESS_REQUESTS = getattr(config, "COMPRESS_REQUESTS", False)
+COMPRESS_MIN_BYTES = getattr(config, "COMPRESS_MIN_BYTES", 2048)
+
+def loads(data):
+    """json.loads, via orjson when it is installed. Accepts str or bytes."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def dumps(obj):
+    """Compact UTF-8 JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+# URLs that answered 415 to a gzip body; they get plain bodies for the rest of the run
+_plain_urls = set()
+_lock = threading.Lock()
+
+def request_body(obj, url):
+    """
+    (data, extra_headers) for POSTing `obj` as JSON to `url`: gzip-encoded when
+    COMPRESS_REQUESTS is on, the body is big enough and `url` has not refused it.
+    """
+    data = dumps(obj)
+    headers = {"Content-Type": "application/json"}
+    if COMPRESS_REQUESTS and len(data) >= COMPRESS_MIN_BYTES and url not in _plain_urls:
+        data = gzip.compress(data, compresslevel=5)
+        headers["Content-Encoding"] = "gzip"
+    return data, headers
+
+def refused_compression(status_code, url, sent_headers):
+    """True (and `url` is remembered) if a gzip body was refused; resend it plain."""
+    if status_code != 415 or sent_headers.get("Content-Encoding") != "gzip":
+        return False
+    with _lock:
+        if url not in _plain_urls:
+            print(f"  [HTTP] {url} does not accept gzip bodies; sending them uncompressed")
+        _plain_urls.add(url)
+    return True
+
+_WS = re.compile(r"[ \t\n\r]*")
+_STRING_END = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+# Everything up to the next bracket, with whole strings swallowed, in one match
+_NO_BRACKETS = re.compile(r'(?:[^"{}\[\]]+|"[^"\\]*(?:\\.[^"\\]*)*")*', re.DOTALL)
+_SCALAR_END = re.compile(r"[,}\]]")
+_scanstring = json.decoder.scanstring
+
+class _More(Exception):
+    """The buffer ends mid-token; wait for the next chunk."""
+
+# Past this many characters without the field, skipping members in Python
+# costs more than one fast full decode of the finished body
+SCAN_LIMIT = 256 * 1024
+
+class SummaryScanner:
+    """
+    Pulls one top-level string field ("summary") out of a JSON object fed in
+    chunks, without building the rest of the document: other members are
+    skipped by matching brackets and strings. `feed()` returns True once the
+    field is found, so the caller can stop reading the body there; otherwise
+    feed the whole body and result() decodes it in full. Scanning gives up
+    after SCAN_LIMIT characters (the body is then just buffered).
+
+        scanner = SummaryScanner()
+        for chunk in response.iter_content(65536):
+            if scanner.feed(chunk):
+                break
+        scanner.result()   # {"summary": ...}, or the full decoded body
+    """
+
+    def __init__(self, key="summary"):
+        self.key = key
+        self.decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        self.buf = ""
+        self.pos = 0
+        self.state = "start"
+        self.depth = 0
+        self.value = None
+        self.found = False
+        self.done = False
+        self.chunks = []  # everything fed, for the full decode when the field is missing
+
+    def feed(self, chunk):
+        if self.found:
+            return True
+        self.chunks.append(chunk)
+        if self.done:
+            return False
+        self.buf += self.decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+        try:
+            while not self.done:
+                self._step()
+        except _More:
+            self.done = self.pos > SCAN_LIMIT
+        return self.found
+
+    def _skip_ws(self):
+        self.pos = _WS.match(self.buf, self.pos).end()
+        if self.pos >= len(self.buf):
+            raise _More()
+        return self.buf[self.pos]
+
+    def _string_end(self, start):
+        # `start` is just past an opening quote
+        match = _STRING_END.match(self.buf, start)
+        if match is None:
+            raise _More()
+        return match.end()
+
+    def _step(self):
+        state = self.state
+        if state == "start":
+            if self._skip_ws() != "{":
+                self.done = True
+                return
+            self.pos += 1
+            self.state = "key"
+        elif state == "key":
+            char = self._skip_ws()
+            if char == ",":
+                self.pos += 1
+                char = self._skip_ws()
+            if char != '"':
+                self.done = True  # "}" (no such field) or not JSON we understand
+                return
+            end = self._string_end(self.pos + 1)
+            self.member, _ = _scanstring(self.buf, self.pos + 1)
+            self.pos = end
+            self.state = "colon"
+        elif state == "colon":
+            if self._skip_ws() != ":":
+                self.done = True
+                return
+            self.pos += 1
+            self.state = "value"
+        elif state == "value":
+            char = self._skip_ws()
+            if self.member == self.key and char == '"':
+                self._string_end(self.pos + 1)
+                self.value, _ = _scanstring(self.buf, self.pos + 1)
+                self.found = self.done = True
+                return
+            if char in "{[":
+                self.depth = 0
+                self.state = "nested"
+            elif char == '"':
+                self.pos = self._string_end(self.pos + 1)
+                self.state = "key"
+            else:
+                match = _SCALAR_END.search(self.buf, self.pos)
+                if match is None:
+                    raise _More()
+                self.pos = match.start()
+                self.state = "key"
+        elif state == "nested":
+            # Resumable across chunks: pos and depth only advance past whole tokens
+            while True:
+                self.pos = _NO_BRACKETS.match(self.buf, self.pos).end()
+                if self.pos >= len(self.buf) or self.buf[self.pos] == '"':
+                    raise _More()  # at the end, or stopped at a string cut off by the chunk
+                self.depth += 1 if self.buf[self.pos] in "{[" else -1
+                self.pos += 1
+                if self.depth == 0:
+                    self.state = "key"
+                    return
+
+    def result(self):
+        """{key: value} when found, else the whole body decoded (or as text if it isn't JSON)."""
+        if self.found:
+            return {self.key: self.value}
+        body = "".join(self.chunks) if self.chunks and isinstance(self.chunks[0], str) else b"".join(self.chunks)
+        try:
+            return loads(body)
+        except ValueError:
+            return body.decode("utf-8", errors="replace") if isinstance(body, bytes) else body
+
+def read_summary(response, chunk_size=65536):
+    """
+    Reads a (stream=True) requests response until its top-level "summary" is
+    known and returns {"summary": ...}; the rest of the body is not read.
+    Bodies without one come back fully decoded, like response.json().
+    """
+    scanner = SummaryScanner()
+    for chunk in response.iter_content(chunk_size=chunk_size):
+        if chunk and scanner.feed(chunk):
+            break
+    return scanner.result()
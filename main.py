@@ -1,8 +1,11 @@
+import asyncio
 import os
-import pandas as pd
+import sys
 import time
+import argparse
 import requests
 import json
+from collections import Counter
 from concurrent.futures import ThreadPoolExecutor
 
 # Import our modules
@@ -11,14 +14,83 @@ import auth
 import file_reader
 import generator
 import sheets_uploader
+import rag_stream
+import incremental
+import results_table
+import report_writer
+import concurrency
+import pipeline
+import quote_index
+import profiler
+import sampling
+import warehouse
+import deadline
+import providers
+import json_codec
 
-def query_rag_system(question, s3_uri, token):
+# Adaptive in-flight limit for RAG queries, shared by every worker thread
+RAG_LIMITER = concurrency.AIMDLimiter(
+    initial=getattr(config, "RAG_INITIAL_CONCURRENCY", 2),
+    maximum=getattr(config, "RAG_MAX_CONCURRENCY", 8)
+)
+
+def load_targets():
     """
-    Queries the RAG API.
+    RAG endpoints every question is sent to. config.RAG_TARGETS lists several
+    for A/B runs; each entry has a "name" and may override "query_url",
+    "team_id" and "s3_base_path". Without it there is a single target built
+    from RAG_QUERY_URL, RAG_TEAM_ID and S3_BASE_PATH.
+    Each target gets its own adaptive limiter, since endpoints differ in capacity.
     """
+    entries = getattr(config, "RAG_TARGETS", None) or [{"name": "default"}]
+    targets = []
+    for n, entry in enumerate(entries):
+        targets.append({
+            "name": entry.get("name") or f"target{n + 1}",
+            "query_url": entry.get("query_url", config.RAG_QUERY_URL),
+            "team_id": entry.get("team_id", config.RAG_TEAM_ID),
+            "s3_base_path": entry.get("s3_base_path", config.S3_BASE_PATH),
+            "limiter": RAG_LIMITER if n == 0 else concurrency.AIMDLimiter(
+                initial=getattr(config, "RAG_INITIAL_CONCURRENCY", 2),
+                maximum=getattr(config, "RAG_MAX_CONCURRENCY", 8)
+            )
+        })
+    return targets
+
+RAG_TARGETS = load_targets()
+MULTI_TARGET = len(RAG_TARGETS) > 1
+
+def target_uri(target, filename):
+    # Assumption: local file "X.pdf" -> BASE_S3 + "X.pdf"
+    return f"{target['s3_base_path']}{filename}"
+
+def target_columns(target):
+    """The Target column, only present when questions fan out to several targets."""
+    return {"Target": target["name"]} if MULTI_TARGET else {}
+
+# Identical responses from different targets are judged once per run
+VERDICTS = concurrency.SingleFlight()
+
+# Per-call timeouts (seconds) and the end-to-end budget of one question (query + judge)
+RAG_CONNECT_TIMEOUT = getattr(config, "RAG_CONNECT_TIMEOUT", 10)
+RAG_READ_TIMEOUT = getattr(config, "RAG_READ_TIMEOUT", 120)
+QUESTION_TIME_BUDGET = getattr(config, "QUESTION_TIME_BUDGET", 300)
+
+# Judge calls go to the LLM provider, which has its own (usually tighter) rate limits.
+# They run as coroutines on providers.loop(), so the limit is an asyncio semaphore.
+JUDGE_SEMAPHORE = asyncio.Semaphore(getattr(config, "JUDGE_MAX_CONCURRENCY", 2))
+
+# Extracted text held at once across every document in the run
+READ_CEILING = file_reader.MemoryCeiling(getattr(config, "READ_MEMORY_LIMIT_MB", 512))
+
+def query_rag_system(question, s3_uri, token, target=None):
+    """
+    Queries the RAG API (the first target unless another is given).
+    """
+    target = target or RAG_TARGETS[0]
     headers = {
         "Authorization": f"Bearer {token}",
-        "X-Doc-Ai-Team-Id": config.RAG_TEAM_ID,
+        "X-Doc-Ai-Team-Id": target["team_id"],
         "Content-Type": "application/json"
     }
     
@@ -27,147 +99,642 @@ def query_rag_system(question, s3_uri, token):
         "documentUris": [s3_uri]
     }
     
-    try:
-        response = requests.post(config.RAG_QUERY_URL, json=body, headers=headers)
-        response.raise_for_status()
-        return response.json() # Adjust based on actual response structure
-    except Exception as e:
-        print(f"RAG Query Failed: {e}")
-        return {"error": str(e)}
-
-def process_file(file_path, input_dir, token, num_questions=10):
+    return send_rag_query(body, headers, target)
+
+def send_rag_query(body, headers, target=None):
+    """
+    Sends one RAG query under the adaptive concurrency limiter.
+    429/5xx responses and connection errors shrink the in-flight limit and are
+    retried (after Retry-After if the server sends one, else exponential backoff).
+    In streaming mode (config.RAG_STREAMING) the SSE/chunked body is read incrementally,
+    rebuilding 'summary' and recording time-to-first-token and tokens/sec; otherwise
+    the body is read only until its top-level 'summary' is known.
+    Every attempt, wait and read is bounded by the thread's current deadline;
+    when it runs out, {"error": ..., "timed_out": True} is returned.
+    """
+    target = target or RAG_TARGETS[0]
+    streaming = getattr(config, "RAG_STREAMING", False)
+    max_retries = getattr(config, "RAG_MAX_RETRIES", 3)
+    
+    if streaming:
+        headers = dict(headers)
+        headers["Accept"] = "text/event-stream, application/x-ndjson, application/json"
+    
+    limit = deadline.current()
+    error = None
+    retry_after = None
+    for attempt in range(max_retries + 1):
+        if attempt and not retry_after:
+            time.sleep(min(2 ** attempt, 30, limit.remaining()))
+        retry_after = None
+        if limit.expired():
+            break
+        
+        try:
+            with target["limiter"].slot(timeout=limit.wait_timeout()) as slot:
+                started = time.perf_counter()
+                try:
+                    data, extra = json_codec.request_body(body, target["query_url"])
+                    response = requests.post(target["query_url"], data=data, headers={**headers, **extra}, stream=True,
+                                             timeout=deadline.timeout(RAG_CONNECT_TIMEOUT, RAG_READ_TIMEOUT))
+                    if json_codec.refused_compression(response.status_code, target["query_url"], extra):
+                        response.close()
+                        data, extra = json_codec.request_body(body, target["query_url"])
+                        response = requests.post(target["query_url"], data=data, headers={**headers, **extra}, stream=True,
+                                                 timeout=deadline.timeout(RAG_CONNECT_TIMEOUT, RAG_READ_TIMEOUT))
+                except requests.exceptions.RequestException as e:
+                    # A timeout cut short by our own deadline says nothing about the server's health
+                    if limit.expired():
+                        slot.neutral()
+                    else:
+                        slot.overloaded()
+                    error = e
+                    continue
+                
+                with response:
+                    if response.status_code == 429 or response.status_code >= 500:
+                        retry_after = concurrency.parse_retry_after(response.headers.get("Retry-After"))
+                        slot.overloaded(retry_after)
+                        error = f"HTTP {response.status_code}"
+                        if retry_after:
+                            # The limiter already holds new calls back until Retry-After has passed
+                            print(f"  [RAG] {error}, retrying after {retry_after:.0f}s")
+                        continue
+                    
+                    try:
+                        response.raise_for_status()
+                        if streaming:
+                            return rag_stream.read_rag_stream(response, started, limit)
+                        return json_codec.read_summary(response)
+                    except deadline.DeadlineExceeded:
+                        slot.neutral()
+                        break
+                    except Exception as e:
+                        slot.neutral()
+                        if limit.expired():
+                            break
+                        print(f"RAG Query Failed: {e}")
+                        return {"error": str(e)}
+        except TimeoutError:
+            # No free slot (or no time left for the request) before the deadline
+            break
+    
+    if limit.expired():
+        return {"error": "Deadline exceeded", "timed_out": True}
+    print(f"RAG Query Failed after {max_retries + 1} attempts: {error}")
+    return {"error": str(error)}
+
+async def evaluate(question, expected, rag_actual, limit):
+    """
+    Runs the LLM judge, bounded by JUDGE_MAX_CONCURRENCY, before `limit` (a Deadline).
+    With several targets, a response another target already gave for the same
+    question reuses that verdict; timeouts and "Error" verdicts are not reused.
+    """
+    async def judge():
+        async with JUDGE_SEMAPHORE:
+            limit.check()
+            timeout = min(providers.LLM_READ_TIMEOUT, limit.remaining())
+            return await generator.evaluate_rag_response(question, expected, rag_actual, timeout=timeout)
+    if not MULTI_TARGET:
+        return await judge()
+    return await VERDICTS.do((question, expected), rag_actual, judge,
+                             keep=lambda status: not str(status).startswith("Error"))
+
+def verdict_done(question, expected):
+    """Called once per target after a question is judged (or skipped); frees its shared verdicts."""
+    if MULTI_TARGET:
+        VERDICTS.finish((question, expected), len(RAG_TARGETS))
+
+def stream_metrics(rag_response_raw):
+    """Returns the streaming timing columns for a result row (empty when not streaming)."""
+    if not getattr(config, "RAG_STREAMING", False):
+        return {}
+    if not isinstance(rag_response_raw, dict):
+        rag_response_raw = {}
+    return {
+        "TTFT (s)": rag_response_raw.get("ttft"),
+        "Tokens/s": rag_response_raw.get("tokens_per_sec")
+    }
+
+def extract_file(job):
+    """
+    Stage 1: read the document (or, in incremental mode, reuse last run's questions).
+    `job` is a dict that carries one file through the pipeline stages.
+    """
+    file_path = job["file_path"]
     filename = os.path.basename(file_path)
+    manifest = job["manifest"]
+    if deadline.RUN.expired():
+        print(f"Skipping {filename}: run time limit reached.")
+        release_document(job)
+        return None
     print(f"Processing: {filename}...")
     
-    # 1. Read File
-    text = file_reader.read_file(file_path)
-    if not text:
-        return []
+    job["filename"] = filename
+    job["qa_pairs"] = None
     
-    # 2. Generate Questions (The "Teacher")
-    print(f"  - Generating questions for {filename}...")
-    qa_pairs = generator.generate_test_cases(filename, text, num_questions=num_questions)
-    print(f"  - Generated {len(qa_pairs)} questions.")
+    # Incremental mode: reuse last run's questions if the document is unchanged
+    if manifest is not None:
+        job["fingerprint"] = incremental.fingerprint_file(file_path)
+        job["doc_state"] = manifest.document_state(filename, job["fingerprint"])
+        job["qa_pairs"] = manifest.cached_cases(filename, job["fingerprint"], job["num_questions"])
+        if job["qa_pairs"] is not None:
+            print(f"  - {filename} unchanged since last run, reusing {len(job['qa_pairs'])} questions.")
+            return job
     
-    # 3. Map to S3
-    # Assumption: local file "X.pdf" -> BASE_S3 + "X.pdf"
-    s3_uri = f"{config.S3_BASE_PATH}{filename}"
+    # Pages stay for quote checks and BM25 scoring; the generator only sees the first DOCUMENT_CHARS
+    lease = job["lease"] = READ_CEILING.lease()
+    pages = file_reader.read_file_pages(file_path, lease=lease)
+    text = document_text(pages or [], generator.DOCUMENT_CHARS)
+    if not text.strip():
+        release_document(job)
+        return None
+    lease.charge(sys.getsizeof(text))
+    job["pages"] = pages
+    job["text"] = text
+    return job
+
+def document_text(pages, limit):
+    """The pages' text joined as the generator sees it, cut at `limit` characters."""
+    parts = []
+    size = 0
+    for _, text in pages:
+        if size >= limit:
+            break
+        parts.append(text + "\n")
+        size += len(text) + 1
+    return "".join(parts)[:limit]
+
+def generate_questions(job):
+    """Stage 2: generate Q&A pairs (The "Teacher")."""
+    try:
+        if job["qa_pairs"] is None:
+            if deadline.RUN.expired():
+                print(f"Skipping {job['filename']}: run time limit reached.")
+                return None
+            print(f"  - Generating questions for {job['filename']}...")
+            job["qa_pairs"] = generator.generate_test_cases(job["filename"], job.pop("text"), num_questions=job["num_questions"])
+            print(f"  - Generated {len(job['qa_pairs'])} questions for {job['filename']}.")
+            indexes = quote_indexes([job.pop("pages")], job["lease"])
+            job["qa_pairs"] = verify_quotes(job["qa_pairs"], indexes)
+            job["qa_pairs"] = score_retrievability(job["qa_pairs"], indexes, job["lease"])
+    finally:
+        # The document's text is no longer needed; give its share of READ_CEILING back
+        release_document(job)
+    return job
+
+def release_document(job):
+    """
+    Drops the file's text, returns its READ_CEILING lease and registers its
+    sampling strata. Also the pipeline's discard hook, so a file that is
+    skipped, cancelled or whose stage failed still gives back what it holds.
+    """
+    job.pop("pages", None)
+    job.pop("text", None)
+    if "lease" in job:
+        job.pop("lease").close()
+    register_strata(job)
+
+def register_strata(job):
+    """
+    SAMPLING_SCOPE "overall": registers the file's questions with the shared
+    estimator as soon as they exist (none if the file was dropped), so no
+    file stops sampling before every file's strata are known.
+    """
+    if job.get("estimator") is not None:
+        job["estimator"].add_document(os.path.basename(job["file_path"]), job.get("qa_pairs") or [])
+
+def quote_indexes(documents_pages, lease=None):
+    """
+    One QuoteIndex per document, shared by the quote check and BM25 scoring;
+    None when both are switched off. Their memory is charged to `lease`.
+    """
+    if getattr(config, "QUOTE_VERIFICATION", "drop") == "off" and not getattr(config, "RETRIEVABILITY_CHECK", True):
+        return None
+    indexes = [quote_index.QuoteIndex(pages) for pages in documents_pages]
+    if lease is not None:
+        lease.charge(sum(index.nbytes for index in indexes))
+    return indexes
+
+def verify_quotes(qa_pairs, indexes, correct_pages=True, split_quotes=False):
+    """
+    Checks each case's metadata.quote against the source text (`indexes`, from
+    quote_indexes()) before any RAG calls are spent on it
+    (config.QUOTE_VERIFICATION: "drop", "flag" or "off").
+    """
+    mode = getattr(config, "QUOTE_VERIFICATION", "drop")
+    if mode == "off" or not qa_pairs:
+        return qa_pairs
+    threshold = getattr(config, "QUOTE_MATCH_THRESHOLD", 0.6)
+    return quote_index.verify_cases(qa_pairs, indexes, mode, threshold, correct_pages, split_quotes)
+
+def score_retrievability(qa_pairs, indexes, lease=None):
+    """
+    Offline retrieval baseline: ranks each question's gold passage with a local
+    BM25 index (config.RETRIEVABILITY_CHECK), so failures can be split into
+    retrieval vs generation problems without extra remote calls.
+    """
+    if not getattr(config, "RETRIEVABILITY_CHECK", True) or not qa_pairs:
+        return qa_pairs
+    import bm25_index  # SciPy is only loaded when questions are actually scored
+    return bm25_index.score_cases(
+        qa_pairs, indexes,
+        top_k=getattr(config, "RETRIEVAL_TOP_K", 5),
+        passage_words=getattr(config, "PASSAGE_WORDS", 200),
+        lease=lease
+    )
+
+def case_columns(meta):
+    """Optional per-question columns from quote verification and BM25 scoring."""
+    columns = {}
+    if "quote_verified" in meta:
+        columns["Quote Verified"] = "Yes" if meta["quote_verified"] else "No"
+    if "bm25_rank" in meta:
+        columns["BM25 Rank"] = meta["bm25_rank"]
+        columns["Retrievable"] = meta.get("retrievable")
+        columns["Difficulty"] = meta.get("difficulty")
+    return columns
+
+def manifest_key(name, target):
+    """Incremental-mode key: the first target keeps the plain file name, others get their own entry."""
+    return name if target is RAG_TARGETS[0] else f"{name} @ {target['name']}"
+
+def question_tasks(entries):
+    """(index, item, target) for every question and target, targets of one question adjacent."""
+    return [(i, item, target) for i, item in entries for target in RAG_TARGETS]
+
+def ask_rag(query):
+    """
+    Runs `query()` (one RAG call) under a fresh per-question budget.
+    Returns (raw response, answer text, seconds used); the answer is "Timed Out"
+    if the budget or the run's time limit ran out first.
+    """
+    started = time.monotonic()
+    if deadline.RUN.expired():
+        return {"timed_out": True}, deadline.TIMED_OUT, 0.0
+    with deadline.scope(QUESTION_TIME_BUDGET or None):
+        rag_response_raw = query()
+    # Assuming rag_response_raw is a dict or string. 
+    # We need to extract the actual answer text.
+    # Adjust this parsing logic based on actual API response structure!
+    # Extract only the 'summary' field from the RAG response
+    if isinstance(rag_response_raw, dict) and rag_response_raw.get("timed_out"):
+        rag_actual = deadline.TIMED_OUT
+    elif isinstance(rag_response_raw, dict):
+        rag_actual = rag_response_raw.get('summary', str(rag_response_raw))
+    else:
+        rag_actual = str(rag_response_raw)
+    return rag_response_raw, rag_actual, time.monotonic() - started
+
+async def judge_within_budget(question, expected, rag_response_raw, rag_actual, used):
+    """
+    Judge verdict using what is left of the question's budget after its RAG call.
+    Returns "Timed Out" instead of judging when the query timed out or no time is left.
+    """
+    if isinstance(rag_response_raw, dict) and rag_response_raw.get("timed_out"):
+        return deadline.TIMED_OUT
+    limit = deadline.Deadline(max(0.0, QUESTION_TIME_BUDGET - used) if QUESTION_TIME_BUDGET else None)
+    limit = limit.earliest(deadline.RUN)
+    try:
+        limit.check()
+        # asyncio's timeout and DeadlineExceeded are both TimeoutErrors
+        status = await asyncio.wait_for(evaluate(question, expected, rag_actual, limit), limit.wait_timeout())
+    except TimeoutError:
+        return deadline.TIMED_OUT
+    # Provider errors caused by the deadline count as timeouts
+    if limit.expired() and str(status).startswith("Error"):
+        return deadline.TIMED_OUT
+    return status
+
+def judge_sync(question, expected, rag_response_raw, rag_actual, used):
+    """judge_within_budget() for worker threads: blocks until the verdict is in."""
+    verdict = judge_within_budget(question, expected, rag_response_raw, rag_actual, used)
+    return asyncio.run_coroutine_threadsafe(verdict, providers.loop()).result()
+
+def query_one(job, token, i, item, target):
+    """One target's RAG answer for one question: (raw response, answer text, seconds used)."""
+    question = item.get("question")
+    if target is RAG_TARGETS[0]:
+        print(f"  - Q{i+1}: {question[:50]}...")
     
-    results = []
+    # Query RAG if we have a token
+    if not token:
+        return None, "Skipped (No Token)", 0.0
+    with profiler.stage("rag_call", job["filename"]):
+        return ask_rag(lambda: query_rag_system(question, target_uri(target, job["filename"]), token, target))
+
+async def judge_one(job, token, i, item, target, response):
+    """Judges one target's response and returns its result row (a coroutine for judge_batch)."""
+    filename = job["filename"]
+    manifest = job["manifest"]
+    key = manifest_key(filename, target)
+    rag_response_raw, rag_actual, used = response
+    question = item.get("question")
+    expected = item.get("expected_answer")
+    meta = item.get("metadata", {})
     
-    # 4. Test RAG System (The "Student")
-    for i, item in enumerate(qa_pairs):
-        question = item.get("question")
-        expected = item.get("expected_answer")
-        meta = item.get("metadata", {})
-        
-        print(f"  - Q{i+1}: {question[:50]}...")
-        
-        # Query RAG if we have a token
-        # Query RAG if we have a token
-        if token:
-            rag_response_raw = query_rag_system(question, s3_uri, token)
-            # Assuming rag_response_raw is a dict or string. 
-            # We need to extract the actual answer text.
-            # Adjust this parsing logic based on actual API response structure!
-            # Extract only the 'summary' field from the RAG response
-            if isinstance(rag_response_raw, dict):
-                rag_actual = rag_response_raw.get('summary', str(rag_response_raw))
-            else:
-                rag_actual = str(rag_response_raw)
-        else:
-            rag_actual = "Skipped (No Token)"
-        
-        
-        # Evaluate
-        if token:
-            print(f"  - Evaluating Q{i+1}...")
-            status = generator.evaluate_rag_response(question, expected, rag_actual)
-        else:
-            status = "Not Answered"
+    # Evaluate (skipped when the response is identical to last run's)
+    previous = manifest.previous_result(key, job["fingerprint"], question) if manifest is not None else None
+    reused_status = manifest.reusable_status(previous, rag_actual) if manifest is not None else None
+    if token and reused_status:
+        print(f"  - Q{i+1} response unchanged, reusing verdict.")
+        status = reused_status
+    elif token:
+        print(f"  - Evaluating Q{i+1}...")
+        status = await judge_within_budget(question, expected, rag_response_raw, rag_actual, used)
+    else:
+        status = "Not Answered"
+    verdict_done(question, expected)
 
-        # Format Page/Section
-        page = meta.get('page')
-        section = meta.get('section')
-        location = ""
-        if page and str(page).lower() != 'na':
-            location += f"Page {page}"
-        if section and str(section).lower() != 'na':
-            if location: location += " / "
-            location += section
-        
-        results.append({
-            "Filename": filename,
-            "S3_URI": s3_uri,
-            "Question": question,
-            "Expected Answer": expected,
-            "RAG Response": rag_actual,
-            "Status": status,
-            "Page/Section": location
-        })
-        
-        # Polite delay to avoid hammering the dev API too hard?
-        time.sleep(0.5)
-        
-    return results
+    # Format Page/Section
+    page = meta.get('page')
+    section = meta.get('section')
+    location = ""
+    if page and str(page).lower() != 'na':
+        location += f"Page {page}"
+    if section and str(section).lower() != 'na':
+        if location: location += " / "
+        location += section
+    
+    row = {
+        "Filename": filename,
+        **target_columns(target),
+        "S3_URI": target_uri(target, filename),
+        "Question": question,
+        "Expected Answer": expected,
+        "RAG Response": rag_actual,
+        "Status": status,
+        "Page/Section": location,
+        **stream_metrics(rag_response_raw),
+        **case_columns(meta)
+    }
+    if manifest is not None:
+        row["Change"] = manifest.classify(job["doc_state"], previous, rag_actual)
+        row["Previous Status"] = previous.get("status", "") if previous else ""
+    if job.get("publisher") is not None:
+        job["publisher"].publish(filename, row)
+    return row
+
+def judge_batch(job, token, tasks, responses):
+    """
+    Judges a batch of question tasks (with their responses, in order) and
+    returns the result rows. The judge calls run together on providers.loop()
+    with asyncio.gather, JUDGE_SEMAPHORE keeping at most JUDGE_MAX_CONCURRENCY
+    in flight, so the calling thread is the only one waiting on the batch.
+    """
+    # Built here: `responses` may still be arriving from the query pool
+    judged = [judge_one(job, token, *task, response) for task, response in zip(tasks, responses)]
+
+    async def judge_all():
+        return await asyncio.gather(*judged)
+
+    with profiler.stage("judge_call", job["filename"]):
+        return asyncio.run_coroutine_threadsafe(judge_all(), providers.loop()).result()
+
+def new_sampler(items, document, estimator=None):
+    """
+    Sequential sampler for one document or comparison group, or None when
+    every question should be judged (config.SAMPLING_MARGIN = 0).
+    `estimator` is shared across documents when SAMPLING_SCOPE is "overall".
+    """
+    margin = getattr(config, "SAMPLING_MARGIN", 0)
+    if not margin or not items:
+        return None
+    if estimator is None:
+        estimator = sampling.Estimator(getattr(config, "SAMPLING_CONFIDENCE", 0.95))
+    return sampling.SequentialSampler(items, document, estimator, margin,
+                                      min_per_stratum=getattr(config, "SAMPLING_MIN_PER_STRATUM", 2),
+                                      batch_size=RAG_LIMITER.maximum)
+
+def sample_questions(job, token, sampler):
+    """
+    Queries and judges questions in batches until the sampler's confidence
+    margin is reached; returns the rows of the questions actually asked.
+    """
+    rows = []
+    with ThreadPoolExecutor(max_workers=query_workers()) as rag_pool:
+        for batch in sampler.batches():
+            tasks = question_tasks(batch)
+            responses = rag_pool.map(lambda task: query_one(job, token, *task), tasks)
+            for (_, item, target), row in zip(tasks, judge_batch(job, token, tasks, responses)):
+                # The first target's verdicts decide when sampling stops
+                if target is RAG_TARGETS[0]:
+                    sampler.record(item, row["Status"])
+                rows.append(row)
+    print(f"  - {job['filename']}: judged {sampler.taken} of {sampler.total} questions; {sampler.estimator.describe()}")
+    return rows
+
+def limits_text():
+    if not MULTI_TARGET:
+        return f"{RAG_LIMITER.limit:.1f}"
+    return ", ".join(f"{target['name']} {target['limiter'].limit:.1f}" for target in RAG_TARGETS)
+
+def query_workers():
+    """Query threads: enough to fill every target's concurrency limit at once."""
+    return sum(target["limiter"].maximum for target in RAG_TARGETS)
+
+def query_questions(job, token):
+    """
+    Stage 3: query the RAG system for every question (The "Student").
+    Questions run on a worker pool; RAG_LIMITER decides how many queries are actually in flight.
+    With sequential sampling the questions are judged here too, batch by batch,
+    and only until accuracy is settled.
+    """
+    qa_pairs = job["qa_pairs"]
+    sampler = new_sampler(qa_pairs, job["filename"], job.get("estimator")) if token else None
+    if sampler is not None:
+        job["rows"] = sample_questions(job, token, sampler)
+        return job
+    
+    with ThreadPoolExecutor(max_workers=query_workers()) as pool:
+        job["responses"] = list(pool.map(lambda task: query_one(job, token, *task), question_tasks(enumerate(qa_pairs))))
+    print(f"  - {job['filename']}: RAG concurrency limit now {limits_text()}")
+    return job
 
-def process_comparison_files(selected_files, input_dir, token, num_questions=10):
-    """Process multiple files together for comparison questions."""
+def judge_questions(job, token):
+    """Stage 4: judge every response and build the file's result rows."""
+    filename = job["filename"]
+    manifest = job["manifest"]
+    qa_pairs = job["qa_pairs"]
+    
+    rows = job.pop("rows", None)
+    if rows is None:
+        # Every target's responses are judged in one batch
+        rows = judge_batch(job, token, question_tasks(enumerate(qa_pairs)), job.pop("responses"))
+    results = results_table.ResultTable(rows)
+    
+    if manifest is not None:
+        for target in RAG_TARGETS:
+            target_rows = (row for row in results if row.get("Target", target["name"]) == target["name"])
+            manifest.record(manifest_key(filename, target), job["fingerprint"], job["num_questions"], qa_pairs, target_rows)
+    
+    job["results"] = results
+    return job
+
+def upload_results(job):
+    """Stage 5: sync the file's results to its own sheet (unless rows were already streamed live)."""
+    if job.get("publisher") is None and len(job["results"]):
+        sheets_uploader.upload_to_google_sheets(job["results"], job["filename"])
+    return job
+
+def new_job(file_path, num_questions, manifest, publisher=None, estimator=None):
+    return {"file_path": file_path, "num_questions": num_questions, "manifest": manifest, "publisher": publisher,
+            "estimator": estimator}
+
+def process_file(file_path, input_dir, token, num_questions=10, manifest=None):
+    """Runs one file through every stage in sequence (no upload)."""
+    job = extract_file(new_job(file_path, num_questions, manifest))
+    if job is None:
+        return results_table.ResultTable()
+    job = generate_questions(job)
+    job = query_questions(job, token)
+    return judge_questions(job, token)["results"]
+
+def process_files_pipelined(selected_files, token_future, num_questions=10, manifest=None, publisher=None, estimator=None):
+    """
+    Direct mode as a staged pipeline: extract -> generate -> query -> judge -> upload,
+    with bounded queues between stages so external latency overlaps across files.
+    `token_future` resolves to the auth token; only the query stage waits for it,
+    so login runs in parallel with extraction and generation.
+    Yields each file's ResultTable as it finishes.
+    """
+    def wait_token():
+        return token_future.result()
+    
+    def profiled(name, func):
+        # Tags the stage for --profile (CPU, memory and stack samples per stage)
+        def run(job):
+            with profiler.stage(name, os.path.basename(job["file_path"])):
+                return func(job)
+        return run
+    
+    stages = [
+        pipeline.Stage("extract", profiled("extract", extract_file), getattr(config, "PIPELINE_EXTRACT_WORKERS", 2), release_document),
+        pipeline.Stage("generate", profiled("generate", generate_questions), getattr(config, "PIPELINE_GENERATE_WORKERS", 1), release_document),
+        pipeline.Stage("query", profiled("query", lambda job: query_questions(job, wait_token())), getattr(config, "PIPELINE_QUERY_WORKERS", 1), release_document),
+        pipeline.Stage("judge", profiled("judge", lambda job: judge_questions(job, wait_token())), getattr(config, "PIPELINE_JUDGE_WORKERS", 1), release_document),
+        pipeline.Stage("upload", profiled("upload", upload_results), 1, release_document)
+    ]
+    pipe = pipeline.Pipeline(stages, queue_size=getattr(config, "PIPELINE_QUEUE_SIZE", 2))
+    pipe.start(new_job(f, num_questions, manifest, publisher, estimator) for f in selected_files)
+    
+    if not wait_token():
+        pipe.cancel()
+        return
+    
+    for job in pipe.results():
+        yield job["results"]
+
+def release_texts(files_data, lease):
+    """Drops the documents' text once comparison questions are ready, returning it to READ_CEILING."""
+    for file_info in files_data:
+        file_info['text'] = ''
+        file_info.pop('pages', None)
+    lease.close()
+
+def process_comparison_files(selected_files, input_dir, token_future, num_questions=10, manifest=None, publisher=None, sheet_name=None):
+    """
+    Process multiple files together for comparison questions.
+    `token_future` resolves to the auth token; the files are read while login
+    runs, and nothing is generated or queried if it fails.
+    With a publisher, each row is streamed to `sheet_name` as soon as it is judged.
+    """
     print(f"\n=== Comparison Mode: Processing {len(selected_files)} files together ===\n")
     
-    # Read all files
+    # Incremental mode: the whole group is keyed by its sorted file names
+    qa_pairs = None
+    if manifest is not None:
+        group_key = " vs ".join(sorted(os.path.basename(f) for f in selected_files))
+        fingerprint = incremental.fingerprint_group(selected_files)
+        doc_state = manifest.document_state(group_key, fingerprint)
+        qa_pairs = manifest.cached_cases(group_key, fingerprint, num_questions)
+    
+    # Read all files; the group shares one lease, since its documents are only useful together
     files_data = []
+    lease = READ_CEILING.lease()
     for file_path in selected_files:
         filename = os.path.basename(file_path)
+        if qa_pairs is not None:
+            # Text is only needed for generation; reuse skips extraction entirely
+            files_data.append({
+                'filename': filename,
+                'text': '',
+                's3_uri': target_uri(RAG_TARGETS[0], filename),
+                'path': file_path
+            })
+            continue
         print(f"Reading: {filename}...")
-        text = file_reader.read_file(file_path)
-        if text:
-            s3_uri = f"{config.S3_BASE_PATH}{filename}"
+        # Only the first COMPARISON_CHARS of each document go into the prompt, so only they are read
+        pages = file_reader.read_file_pages(file_path, max_chars=generator.COMPARISON_CHARS, lease=lease)
+        text = document_text(pages or [], generator.COMPARISON_CHARS)
+        if text.strip():
+            lease.charge(sys.getsizeof(text))
+            s3_uri = target_uri(RAG_TARGETS[0], filename)
             files_data.append({
                 'filename': filename,
                 'text': text,
+                'pages': pages,
                 's3_uri': s3_uri,
                 'path': file_path
             })
     
     if len(files_data) < 2:
         print("Error: Comparison mode requires at least 2 files.")
-        return []
+        release_texts(files_data, lease)
+        return results_table.ResultTable()
+    
+    token = token_future.result()
+    if not token:
+        release_texts(files_data, lease)
+        return results_table.ResultTable()
     
-    # Generate comparison questions
-    print(f"\n  - Generating comparison questions across {len(files_data)} files...")
-    qa_pairs = generator.generate_comparison_test_cases(files_data, num_questions=num_questions)
-    print(f"  - Generated {len(qa_pairs)} comparison questions.\n")
+    if qa_pairs is not None:
+        print(f"  - Documents unchanged since last run, reusing {len(qa_pairs)} comparison questions.\n")
+    else:
+        # Generate comparison questions
+        print(f"\n  - Generating comparison questions across {len(files_data)} files...")
+        qa_pairs = generator.generate_comparison_test_cases(files_data, num_questions=num_questions)
+        print(f"  - Generated {len(qa_pairs)} comparison questions.\n")
+        # Quotes may come from any of the documents (or several), so pages are only checked, not corrected
+        indexes = quote_indexes([f['pages'] for f in files_data], lease)
+        qa_pairs = verify_quotes(qa_pairs, indexes, correct_pages=False, split_quotes=True)
+        qa_pairs = score_retrievability(qa_pairs, indexes, lease)
+    release_texts(files_data, lease)
     
     # Process each comparison question
-    results = []
-    for i, qa in enumerate(qa_pairs):
+    results = results_table.ResultTable()
+    def run_question(i, qa, target):
         question = qa['question']
         expected = qa['expected_answer']
         meta = qa.get('metadata', {})
+        key = manifest_key(group_key, target) if manifest is not None else None
         
-        print(f"  - Q{i+1}: {question[:60]}...")
+        if target is RAG_TARGETS[0]:
+            print(f"  - Q{i+1}: {question[:60]}...")
         
         # For comparison queries, use ALL document URIs
-        all_uris = [f['s3_uri'] for f in files_data]
+        all_uris = [target_uri(target, f['filename']) for f in files_data]
         
         # Query RAG with all documents
+        rag_response_raw = None
+        used = 0.0
         if token:
-            rag_response_raw = query_rag_system_multi(question, all_uris, token)
-            
-            if isinstance(rag_response_raw, dict):
-                rag_actual = rag_response_raw.get('summary', str(rag_response_raw))
-            else:
-                rag_actual = str(rag_response_raw)
+            rag_response_raw, rag_actual, used = ask_rag(lambda: query_rag_system_multi(question, all_uris, token, target))
         else:
             rag_actual = "Skipped (No Token)"
         
-        # Evaluate
-        if token:
+        # Evaluate (skipped when the response is identical to last run's)
+        previous = manifest.previous_result(key, fingerprint, question) if manifest is not None else None
+        reused_status = manifest.reusable_status(previous, rag_actual) if manifest is not None else None
+        if token and reused_status:
+            print(f"  - Q{i+1} response unchanged, reusing verdict.")
+            status = reused_status
+        elif token:
             print(f"  - Evaluating Q{i+1}...")
-            status = generator.evaluate_rag_response(question, expected, rag_actual)
+            status = judge_sync(question, expected, rag_response_raw, rag_actual, used)
         else:
             status = "Not Answered"
+        verdict_done(question, expected)
         
         # Format metadata
         docs_list = meta.get('documents', [f['filename'] for f in files_data])
@@ -194,24 +761,54 @@ def process_comparison_files(selected_files, input_dir, token, num_questions=10)
             else:
                 location = section
 
-        results.append({
+        row = {
             'Filename': ', '.join(docs_list),
+            **target_columns(target),
             'S3_URI': ', '.join(all_uris),
             'Question': question,
             'Expected Answer': expected,
             'RAG Response': rag_actual,
             'Status': status,
             'Page/Section': location,
-            'Comparison Type': comparison_type
-        })
+            'Comparison Type': comparison_type,
+            **stream_metrics(rag_response_raw),
+            **case_columns(meta)
+        }
+        if manifest is not None:
+            row['Change'] = manifest.classify(doc_state, previous, rag_actual)
+            row['Previous Status'] = previous.get('status', '') if previous else ''
+        if publisher is not None:
+            publisher.publish(sheet_name, row)
+        return row
+    
+    sampler = new_sampler(qa_pairs, " vs ".join(os.path.basename(f) for f in selected_files)) if token else None
+    with ThreadPoolExecutor(max_workers=query_workers()) as pool:
+        if sampler is None:
+            for row in pool.map(lambda task: run_question(*task), question_tasks(enumerate(qa_pairs))):
+                results.append(row)
+        else:
+            for batch in sampler.batches():
+                tasks = question_tasks(batch)
+                for (_, item, target), row in zip(tasks, pool.map(lambda task: run_question(*task), tasks)):
+                    if target is RAG_TARGETS[0]:
+                        sampler.record(item, row['Status'])
+                    results.append(row)
+            print(f"  - Judged {sampler.taken} of {sampler.total} questions; {sampler.estimator.describe()}")
+    print(f"  - RAG concurrency limit now {limits_text()}")
+    
+    if manifest is not None:
+        for target in RAG_TARGETS:
+            target_rows = (row for row in results if row.get('Target', target['name']) == target['name'])
+            manifest.record(manifest_key(group_key, target), fingerprint, num_questions, qa_pairs, target_rows)
         
     return results
 
-def query_rag_system_multi(question, s3_uris, token):
+def query_rag_system_multi(question, s3_uris, token, target=None):
     """Query RAG system with multiple document URIs for comparison."""
+    target = target or RAG_TARGETS[0]
     headers = {
         "Authorization": f"Bearer {token}",
-        "X-Doc-Ai-Team-Id": config.RAG_TEAM_ID,
+        "X-Doc-Ai-Team-Id": target["team_id"],
         "Content-Type": "application/json"
     }
     
@@ -220,16 +817,26 @@ def query_rag_system_multi(question, s3_uris, token):
         "documentUris": s3_uris  # Multiple URIs for comparison
     }
     
-    try:
-        response = requests.post(config.RAG_QUERY_URL, json=body, headers=headers)
-        response.raise_for_status()
-        return response.json()
-    except Exception as e:
-        print(f"RAG Query Failed: {e}")
-        return {"error": str(e)}
-
-def main():
-    input_dir = input(f"Enter directory path containing files (default: {config.DEFAULT_INPUT_DIR}): ").strip()
+    return send_rag_query(body, headers, target)
+
+def ask(args, prompt, value):
+    """
+    Answer for one interactive prompt: the command-line flag if given,
+    the default ("") with --no-input, otherwise ask the user.
+    """
+    if value is not None:
+        return str(value).strip()
+    if args.no_input:
+        return ""
+    return input(prompt).strip()
+
+def main(args=None):
+    if args is None:
+        args = parse_args([])
+    if args.provider:
+        generator.set_provider(args.provider)
+    
+    input_dir = ask(args, f"Enter directory path containing files (default: {config.DEFAULT_INPUT_DIR}): ", args.input_dir)
     if not input_dir:
         input_dir = config.DEFAULT_INPUT_DIR
         
@@ -256,22 +863,35 @@ def main():
     print("  2. Direct (test individual files separately)")
     print("="*60)
     
-    mode = input("Enter choice (1 or 2): ").strip()
+    mode = ask(args, "Enter choice (1 or 2): ", args.mode)
+    mode = {"comparison": "1", "direct": "2"}.get(mode, mode)
     
     # File selection
     print("\nSelect files to test:")
     print("  - Enter file numbers separated by commas (e.g., 1,2,3)")
     print("  - Or press Enter to use ALL files")
     
-    selection = input("Your selection: ").strip()
+    selection = ask(args, "Your selection: ", args.files)
     
-    if not selection:
+    if not selection or selection.lower() == "all":
         selected_indices = list(range(len(files)))
     else:
-        try:
-            selected_indices = [int(x.strip()) - 1 for x in selection.split(',')]
-            selected_indices = [i for i in selected_indices if 0 <= i < len(files)]
-        except:
+        # Numbers from the list above, or file names
+        selected_indices = []
+        invalid = []
+        for entry in (x.strip() for x in selection.split(',')):
+            if entry.isdigit() and 1 <= int(entry) <= len(files):
+                selected_indices.append(int(entry) - 1)
+            elif entry in files:
+                selected_indices.append(files.index(entry))
+            else:
+                invalid.append(entry)
+        selected_indices = list(dict.fromkeys(selected_indices))
+        if invalid and args.no_input:
+            # Nobody is there to notice a fallback; fail instead of testing the wrong files
+            sys.exit(f"Error: --files {', '.join(invalid)}: no such file number or name "
+                     f"(expected 1-{len(files)} or a file name from {input_dir})")
+        if invalid:
             print("Invalid selection. Using all files.")
             selected_indices = list(range(len(files)))
     
@@ -284,7 +904,7 @@ def main():
     print(f"\nSelected {len(selected_files)} file(s) for testing.\n")
     
     # Ask for number of questions
-    num_questions_input = input("Enter number of questions to generate per file (default: 10): ").strip()
+    num_questions_input = ask(args, "Enter number of questions to generate per file (default: 10): ", args.questions)
     if num_questions_input:
         try:
             num_questions = int(num_questions_input)
@@ -298,47 +918,134 @@ def main():
         num_questions = 10
     
     print(f"Will generate {num_questions} question(s) per file.\n")
+    
+    if args.dry_run:
+        print(f"Dry run: {'Comparison' if mode == '1' else 'Direct'} mode over:")
+        for f in selected_files:
+            print(f"  - {f}")
+        return
 
+    # RUN_TIME_LIMIT: files not started in time are skipped, unfinished questions are recorded as "Timed Out"
+    deadline.start_run(getattr(config, "RUN_TIME_LIMIT", 0))
+    
     # Authentication
+    # Login runs in the background so it overlaps with extraction and generation
     print("Authenticating...")
-    token = auth.login_and_get_token()
-    if not token:
-        print("Warning: Could not obtain token. RAG queries will be skipped.")
-        return
+    auth_pool = ThreadPoolExecutor(max_workers=1)
+    token_future = auth_pool.submit(auth.login_and_get_token)
+    auth_pool.shutdown(wait=False)
     
-    all_results = []
+    all_results = results_table.ResultTable()
     
-    # Execute based on mode
-    if mode == "1":
-        # Comparison mode
-        all_results = process_comparison_files(selected_files, input_dir, token, num_questions)
-        
-        if all_results:
+    # Incremental mode: compare against the previous run's manifest
+    manifest = None
+    if getattr(config, "INCREMENTAL_MODE", False):
+        manifest = incremental.Manifest(getattr(config, "MANIFEST_PATH", "rag_test_manifest.json"))
+        print(f"Incremental mode: comparing against {manifest.path}")
+    
+    # Live Sheets updates: rows are streamed to Google Sheets while the run continues
+    publisher = None
+    if getattr(config, "SHEETS_LIVE_UPDATES", True):
+        publisher = sheets_uploader.SheetsPublisher(
+            flush_seconds=getattr(config, "SHEETS_FLUSH_SECONDS", 5),
+            writes_per_minute=getattr(config, "SHEETS_WRITES_PER_MINUTE", 50)
+        ).start()
+    
+    # Rows queued for Sheets are flushed and formatted even when the run ends early
+    try:
+        # Execute based on mode
+        if mode == "1":
+            # Comparison mode
             # Create a combined sheet name: file1 vs file2...
             base_names = [os.path.basename(f) for f in selected_files]
             sheet_title = " vs ".join(base_names)
             # Limit sheet title length (Google Sheets limit is 100)
             if len(sheet_title) > 90: sheet_title = sheet_title[:87] + "..."
-            
-            sheets_uploader.upload_to_google_sheets(pd.DataFrame(all_results), sheet_title)
-    else:
-        # Direct mode (existing behavior)
-        print("\n=== Direct Mode: Processing files individually ===\n")
-        for file_path in selected_files:
-            file_results = process_file(file_path, input_dir, token, num_questions)
-            if file_results:
+        
+            with profiler.stage("comparison"):
+                all_results = process_comparison_files(selected_files, input_dir, token_future, num_questions, manifest,
+                                                       publisher, sheet_title)
+            if not token_future.result():
+                print("Warning: Could not obtain token. RAG queries will be skipped.")
+                return
+        
+            if all_results and publisher is None:
+                sheets_uploader.upload_to_google_sheets(all_results, sheet_title)
+        else:
+            # Direct mode (existing behavior)
+            print("\n=== Direct Mode: Processing files individually ===\n")
+            # Each file is synced to its own sheet, live or by the pipeline's upload stage
+            # SAMPLING_SCOPE "overall": one estimate across files decides when every file can stop
+            estimator = None
+            if getattr(config, "SAMPLING_MARGIN", 0) and getattr(config, "SAMPLING_SCOPE", "document") == "overall":
+                estimator = sampling.Estimator(getattr(config, "SAMPLING_CONFIDENCE", 0.95))
+                estimator.expect(len(selected_files))
+            for file_results in process_files_pipelined(selected_files, token_future, num_questions, manifest, publisher,
+                                                        estimator):
                 all_results.extend(file_results)
-                # Sync each file to its own sheet
-                sheets_uploader.upload_to_google_sheets(pd.DataFrame(file_results), os.path.basename(file_path))
-    
-    # Save results to local Excel (Combined)
-    if all_results:
-        df = pd.DataFrame(all_results)
-        output_file = "rag_test_results.xlsx"
-        df.to_excel(output_file, index=False)
-        print(f"\nDone! Results saved to {output_file}")
-    else:
-        print("\nNo results generated.")
+            if not token_future.result():
+                print("Warning: Could not obtain token. RAG queries will be skipped.")
+                return
+            if estimator is not None:
+                print(f"\nOverall estimate ({estimator.sampled()} questions judged): {estimator.describe()}")
+    
+        # Save results to local Excel (Combined)
+        if all_results:
+            report_format = getattr(config, "REPORT_FORMAT", "xlsx")
+            with profiler.stage("report"):
+                output_file = report_writer.write_report(all_results, "rag_test_results", report_format)
+            if output_file:
+                print(f"\nDone! Results saved to {output_file}")
+            timed_out = sum(1 for status in all_results.column("Status") if status == deadline.TIMED_OUT)
+            if timed_out:
+                print(f"{timed_out} question(s) ran out of time (Status \"{deadline.TIMED_OUT}\").")
+            if manifest is not None:
+                print("Changes since last run:")
+                for change, count in Counter(all_results.column("Change")).most_common():
+                    print(f"  {change}: {count}")
+                manifest.save()
+            warehouse_path = getattr(config, "WAREHOUSE_PATH", "rag_results.db")
+            if warehouse_path:
+                store = warehouse.Warehouse(warehouse_path)
+                try:
+                    run_id = store.record_run(all_results, label=args.run_label,
+                                              mode="comparison" if mode == "1" else "direct")
+                finally:
+                    store.close()
+                print(f"Run {run_id} stored in {warehouse_path} (python warehouse.py accuracy|regressions|flaky)")
+        else:
+            print("\nNo results generated.")
+    finally:
+        if publisher is not None:
+            publisher.close()
+
+def parse_args(argv=None):
+    """
+    Every interactive prompt has a flag; prompts are only shown for flags that
+    were not given, and never with --no-input. E.g.
+        python main.py --input-dir ./data --mode direct --files all --questions 5 --no-input
+    """
+    parser = argparse.ArgumentParser(description="Generate questions from documents, query the RAG system and judge the answers.")
+    parser.add_argument("--input-dir", help=f"Directory containing PDF/DOCX files (default: {config.DEFAULT_INPUT_DIR})")
+    parser.add_argument("--mode", choices=["1", "2", "comparison", "direct"], help="1/comparison or 2/direct")
+    parser.add_argument("--files", help='File numbers or names, comma separated, or "all"')
+    parser.add_argument("--questions", type=int, help="Questions to generate per file (default: 10)")
+    parser.add_argument("--provider", choices=["gemini", "mistral", "groq", "openrouter"],
+                        help="Use this LLM provider without probing the others")
+    parser.add_argument("--run-label", help="Name stored with this run in the results warehouse, e.g. a build number")
+    parser.add_argument("--no-input", action="store_true", help="Never prompt; use defaults for anything not given")
+    parser.add_argument("--dry-run", action="store_true", help="Show which files would be tested, then exit")
+    parser.add_argument("--profile", action="store_true",
+                        help="Sample CPU per pipeline stage and track memory; reports go to a new directory under RUN_DIR")
+    return parser.parse_args(argv)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    args = parse_args()
+    if args.profile:
+        run_dir = os.path.join(getattr(config, "RUN_DIR", "runs"), time.strftime("%Y%m%d-%H%M%S"))
+        profiler.start(run_dir)
+    try:
+        main(args)
+    finally:
+        providers.close()
+        profiler.stop()
@@ -0,0 +1,117 @@
+import queue
+import threading
+
+# Marks the end of a stage's input
+_DONE = object()
+
+class Stage:
+    """
+    One step of the pipeline: `func(item)` runs on `workers` threads.
+    Returning None drops the item (e.g. an unreadable file).
+    `discard(item)`, if given, is called for items this stage drops without
+    finishing them: skipped after cancel(), `func` raised, or the result could
+    not be passed on; it releases whatever the item still holds.
+    """
+
+    def __init__(self, name, func, workers=1, discard=None):
+        self.name = name
+        self.func = func
+        self.workers = max(1, int(workers))
+        self.discard = discard
+
+class Pipeline:
+    """
+    Runs items through stages connected by bounded queues, so while file N is
+    being judged, file N+1 can be querying and file N+2 generating.
+    The bounded queues keep at most `queue_size` items waiting between stages,
+    which caps how many extracted documents are held in memory at once.
+
+        pipe = Pipeline([Stage("extract", read, 2), Stage("generate", gen)])
+        pipe.start(files)
+        for result in pipe.results():
+            ...
+    """
+
+    def __init__(self, stages, queue_size=2):
+        self.stages = stages
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+        self.output = queue.Queue()
+        self.cancelled = threading.Event()
+        self.threads = []
+
+    def _put(self, q, item):
+        # Poll so a cancelled run can't leave a worker blocked on a full queue
+        while not self.cancelled.is_set():
+            try:
+                q.put(item, timeout=0.2)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _worker(self, index, remaining, lock):
+        stage = self.stages[index]
+        in_q = self.queues[index]
+        out_q = self.queues[index + 1] if index + 1 < len(self.stages) else self.output
+
+        while True:
+            item = in_q.get()
+            if item is _DONE:
+                # Pass the sentinel on for sibling workers; the last one closes the next stage
+                in_q.put(_DONE)
+                with lock:
+                    remaining[0] -= 1
+                    last = remaining[0] == 0
+                if last:
+                    out_q.put(_DONE)
+                return
+            if self.cancelled.is_set():
+                self._discard(stage, item)
+                continue
+            try:
+                result = stage.func(item)
+            except Exception as e:
+                print(f"  [Pipeline] {stage.name} failed: {e}")
+                self._discard(stage, item)
+                continue
+            if result is not None and not self._put(out_q, result):
+                self._discard(stage, result)
+
+    def _discard(self, stage, item):
+        if stage.discard is None:
+            return
+        try:
+            stage.discard(item)
+        except Exception as e:
+            print(f"  [Pipeline] {stage.name} cleanup failed: {e}")
+
+    def _feed(self, items):
+        for item in items:
+            if not self._put(self.queues[0], item):
+                break
+        self.queues[0].put(_DONE)
+
+    def start(self, items):
+        for index, stage in enumerate(self.stages):
+            remaining = [stage.workers]
+            lock = threading.Lock()
+            for n in range(stage.workers):
+                t = threading.Thread(target=self._worker, args=(index, remaining, lock),
+                                     name=f"{stage.name}-{n}", daemon=True)
+                t.start()
+                self.threads.append(t)
+        feeder = threading.Thread(target=self._feed, args=(items,), name="feeder", daemon=True)
+        feeder.start()
+        self.threads.append(feeder)
+
+    def results(self):
+        """Yields finished items in completion order until every stage has drained."""
+        while True:
+            item = self.output.get()
+            if item is _DONE:
+                return
+            yield item
+
+    def cancel(self):
+        """Stops taking new work; items already inside a stage finish and are discarded."""
+        self.cancelled.set()
@@ -0,0 +1,207 @@
+import csv
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from contextlib import contextmanager, nullcontext
+
+# The running profiler, or None. stage() is a no-op while this is None.
+ACTIVE = None
+
+def _rss_bytes():
+    """Current resident set size, or None if it can't be read on this platform."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+# Innermost frames of a thread that is blocked rather than running
+_WAIT_FUNCTIONS = {
+    "threading.py": {"wait", "_wait_for_tstate_lock", "acquire"},
+    "queue.py": {"get", "put"},
+    "selectors.py": {"select"},
+    "socket.py": {"readinto", "recv_into", "accept"},
+    "ssl.py": {"read", "recv_into"},
+}
+
+def _waiting(frame):
+    code = frame.f_code
+    return code.co_name in _WAIT_FUNCTIONS.get(os.path.basename(code.co_filename), ())
+
+def _thread_cpu(thread_id):
+    """CPU seconds used so far by another thread, or None where the platform can't tell."""
+    try:
+        return time.clock_gettime(time.pthread_getcpuclockid(thread_id))
+    except (AttributeError, OSError, OverflowError):
+        return None
+
+class Profiler:
+    """
+    Sampling profiler with pipeline-stage attribution.
+
+    - A background thread samples every thread's Python stack each `interval`
+      seconds; stacks are prefixed with the thread's current stage and written
+      in collapsed format ("stage;file.py:func;... microseconds") for
+      flamegraph.pl, speedscope or inferno. Each sample is weighted by the CPU
+      time the thread used since the previous one, so blocked threads don't
+      show up; where per-thread CPU clocks are missing (Windows), samples
+      whose innermost frame is a wait are skipped instead.
+    - stage() records per-stage CPU (thread_time) and wall time, and the peak
+      traced memory while the stage ran.
+    - The top allocation sites are snapshotted once, at the end of the run.
+    """
+
+    def __init__(self, run_dir, interval=0.01, top_n=15):
+        self.run_dir = run_dir
+        self.interval = interval
+        self.top_n = top_n
+        self.samples = Counter()
+        self.thread_stage = {}
+        self.stage_rows = []
+        self.stage_totals = defaultdict(lambda: [0, 0.0, 0.0])  # calls, cpu, wall
+        self.stage_peaks = {}  # id of a running stage -> highest traced memory seen
+        self.file_peaks = {}
+        self.allocations = []
+        self.cpu_seen = {}
+        self.lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        os.makedirs(self.run_dir, exist_ok=True)
+        tracemalloc.start(1)  # one frame per trace keeps allocation tracking cheap
+        self._thread = threading.Thread(target=self._sample_loop, name="profiler", daemon=True)
+        self._thread.start()
+
+    def _sample_loop(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            # reset_peak() by an overlapping stage would hide this stage's earlier peak
+            traced = tracemalloc.get_traced_memory()[0]
+            with self.lock:
+                for key, peak in self.stage_peaks.items():
+                    self.stage_peaks[key] = max(peak, traced)
+
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                cpu = _thread_cpu(thread_id)
+                if cpu is None:
+                    weight = 0 if _waiting(frame) else self.interval
+                else:
+                    weight = cpu - self.cpu_seen.get(thread_id, cpu)
+                    self.cpu_seen[thread_id] = cpu
+                if weight <= 0:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                stage = self.thread_stage.get(thread_id, "other")
+                self.samples[";".join([stage] + stack[::-1])] += weight
+
+    @contextmanager
+    def stage(self, name, label=None):
+        thread_id = threading.get_ident()
+        outer = self.thread_stage.get(thread_id)
+        self.thread_stage[thread_id] = name
+        key = object()
+        tracemalloc.reset_peak()
+        with self.lock:
+            self.stage_peaks[key] = tracemalloc.get_traced_memory()[0]
+        cpu_start = time.thread_time()
+        wall_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            cpu = time.thread_time() - cpu_start
+            wall = time.perf_counter() - wall_start
+            if outer is None:
+                self.thread_stage.pop(thread_id, None)
+            else:
+                self.thread_stage[thread_id] = outer
+
+            traced_current, traced_peak = tracemalloc.get_traced_memory()
+            rss = _rss_bytes()
+            with self.lock:
+                # Process-wide memory, so stages running at the same time share their peaks
+                traced_peak = max(traced_peak, self.stage_peaks.pop(key))
+                totals = self.stage_totals[name]
+                totals[0] += 1
+                totals[1] += cpu
+                totals[2] += wall
+                self.stage_rows.append([name, label or "", round(cpu, 4), round(wall, 4),
+                                        traced_current, traced_peak, rss or ""])
+                if label:
+                    self.file_peaks[label] = max(self.file_peaks.get(label, 0), traced_peak)
+
+    def snapshot_allocations(self, label):
+        """Top-N allocation sites (by size) still held now."""
+        stats = tracemalloc.take_snapshot().statistics("lineno")
+        with self.lock:
+            self.allocations.append((label, stats[:self.top_n]))
+
+    def stop(self):
+        """Stops sampling and writes every report into run_dir."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self.snapshot_allocations("end of run")
+        tracemalloc.stop()
+
+        folded_path = os.path.join(self.run_dir, "profile.folded")
+        with open(folded_path, "w", encoding="utf-8") as f:
+            for stack, seconds in self.samples.most_common():
+                micros = round(seconds * 1e6)
+                if micros:
+                    f.write(f"{stack} {micros}\n")
+
+        with open(os.path.join(self.run_dir, "stages.csv"), "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["stage", "file", "cpu_s", "wall_s", "traced_bytes", "traced_peak_bytes", "rss_bytes"])
+            writer.writerows(self.stage_rows)
+
+        with open(os.path.join(self.run_dir, "memory.txt"), "w", encoding="utf-8") as f:
+            f.write("Peak traced memory per file (during its stages)\n")
+            for label, peak in self.file_peaks.items():
+                f.write(f"  {label}: {peak / 1e6:.1f} MB\n")
+            for label, stats in self.allocations:
+                f.write(f"\nTop {self.top_n} allocation sites - {label}\n")
+                for stat in stats:
+                    f.write(f"  {stat}\n")
+
+        print(f"\nProfile written to {self.run_dir}")
+        print(f"  {'stage':<12}{'calls':>6}{'cpu s':>10}{'wall s':>10}")
+        for name, (calls, cpu, wall) in self.stage_totals.items():
+            print(f"  {name:<12}{calls:>6}{cpu:>10.2f}{wall:>10.2f}")
+        print(f"  CPU flamegraph: flamegraph.pl {folded_path} > flame.svg (or load it in speedscope.app)")
+
+def start(run_dir, interval=0.01, top_n=15):
+    global ACTIVE
+    ACTIVE = Profiler(run_dir, interval, top_n)
+    ACTIVE.start()
+    return ACTIVE
+
+def stop():
+    global ACTIVE
+    if ACTIVE is not None:
+        ACTIVE.stop()
+        ACTIVE = None
+
+def stage(name, label=None):
+    """Marks a pipeline stage for the profiler; does nothing when profiling is off."""
+    if ACTIVE is None:
+        return nullcontext()
+    return ACTIVE.stage(name, label)
@@ -0,0 +1,166 @@
+import abc
+import asyncio
+import threading
+
+import config
+import deadline
+import json_codec
+
+# Per-call timeouts (seconds); the read timeout is also capped by the caller's deadline
+LLM_CONNECT_TIMEOUT = getattr(config, "LLM_CONNECT_TIMEOUT", 10)
+LLM_READ_TIMEOUT = getattr(config, "LLM_READ_TIMEOUT", 120)
+# Connections kept open per backend; calls beyond this queue inside the client
+LLM_MAX_CONNECTIONS = getattr(config, "LLM_MAX_CONNECTIONS", 20)
+
+class Provider(abc.ABC):
+    """
+    One LLM backend. Clients and model handles are created on first use and
+    reused for every later call; all calls run on the shared event loop below.
+
+        text = await providers.get("mistral").generate(prompt, json=True)
+    """
+
+    name = None
+
+    @abc.abstractmethod
+    async def generate(self, prompt, json=False, timeout=None):
+        """Returns the model's text for `prompt`; raises on HTTP or API errors."""
+
+    async def aclose(self):
+        pass
+
+class GeminiProvider(Provider):
+    name = "gemini"
+
+    def __init__(self, model_name, api_key):
+        self.model_name = model_name
+        self.api_key = api_key
+        self._model = None
+
+    def model(self):
+        # google.generativeai takes seconds to import, so it is loaded on first Gemini use
+        if self._model is None:
+            import google.generativeai as genai
+            genai.configure(api_key=self.api_key)
+            self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    async def generate(self, prompt, json=False, timeout=None):
+        generation_config = {"response_mime_type": "application/json"} if json else None
+        response = await asyncio.wait_for(
+            self.model().generate_content_async(prompt, generation_config=generation_config),
+            timeout
+        )
+        return response.text
+
+class ChatCompletionsProvider(Provider):
+    """OpenAI-style /chat/completions backends (Mistral, Groq, OpenRouter)."""
+
+    def __init__(self, name, url, api_key, model, headers=None):
+        self.name = name
+        self.url = url
+        self.api_key = api_key
+        self.model = model
+        self.headers = headers or {}
+        self._client = None
+
+    def client(self):
+        # One pooled (keep-alive) client per backend, created on the event loop
+        if self._client is None:
+            import httpx
+            self._client = httpx.AsyncClient(
+                headers={"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json", **self.headers},
+                timeout=httpx.Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+                limits=httpx.Limits(max_connections=LLM_MAX_CONNECTIONS)
+            )
+        return self._client
+
+    async def generate(self, prompt, json=False, timeout=None):
+        import httpx
+        payload = {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": 0.2
+        }
+        if json:
+            payload["response_format"] = {"type": "json_object"}
+        read = LLM_READ_TIMEOUT if timeout is None else min(timeout, LLM_READ_TIMEOUT)
+        limits = httpx.Timeout(read, connect=min(LLM_CONNECT_TIMEOUT, read))
+        data, headers = json_codec.request_body(payload, self.url)
+        response = await self.client().post(self.url, content=data, headers=headers, timeout=limits)
+        if json_codec.refused_compression(response.status_code, self.url, headers):
+            data, headers = json_codec.request_body(payload, self.url)
+            response = await self.client().post(self.url, content=data, headers=headers, timeout=limits)
+        response.raise_for_status()
+        return json_codec.loads(response.content)['choices'][0]['message']['content']
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+def _build(name):
+    import generator  # model names live with the prompts
+    if name == "gemini":
+        return GeminiProvider(generator.MODEL_NAME, config.GOOGLE_API_KEY)
+    if name == "mistral":
+        return ChatCompletionsProvider("mistral", "https://api.mistral.ai/v1/chat/completions",
+                                       config.MISTRAL_API_KEY, generator.MISTRAL_MODEL)
+    if name == "groq":
+        return ChatCompletionsProvider("groq", "https://api.groq.com/openai/v1/chat/completions",
+                                       config.GROQ_API_KEY, generator.GROQ_MODEL)
+    if name == "openrouter":
+        return ChatCompletionsProvider("openrouter", "https://openrouter.ai/api/v1/chat/completions",
+                                       config.OPENROUTER_API_KEY, generator.OPENROUTER_MODEL,
+                                       headers={
+                                           "HTTP-Referer": "https://rag-evaluator.local",  # OpenRouter requirement
+                                           "X-Title": "RAG Evaluator Script"
+                                       })
+    raise ValueError(f"Unknown provider: {name}")
+
+_providers = {}
+_loop = None
+_lock = threading.Lock()
+
+def get(name):
+    """The long-lived Provider for "gemini", "mistral", "groq" or "openrouter"."""
+    with _lock:
+        provider = _providers.get(name)
+        if provider is None:
+            provider = _providers[name] = _build(name)
+        return provider
+
+def loop():
+    """The event loop every provider call runs on (started in a daemon thread on first use)."""
+    global _loop
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="llm-loop", daemon=True).start()
+        return _loop
+
+async def generate(name, prompt, json=False, timeout=None):
+    """Async entry point, e.g. asyncio.gather(*(generate("groq", p) for p in prompts)) on loop()."""
+    return await get(name).generate(prompt, json=json, timeout=timeout)
+
+def generate_sync(name, prompt, json=False):
+    """
+    Blocking call for worker threads: the request runs on the shared loop and
+    its pooled connections, and the calling thread blocks until the result
+    arrives, so each in-flight call still occupies one thread. The timeout
+    comes from the calling thread's deadline.
+    """
+    timeout = deadline.seconds(LLM_READ_TIMEOUT)
+    future = asyncio.run_coroutine_threadsafe(get(name).generate(prompt, json=json, timeout=timeout), loop())
+    try:
+        return future.result(timeout + LLM_CONNECT_TIMEOUT)
+    except TimeoutError:
+        future.cancel()
+        raise deadline.DeadlineExceeded(f"{name} call exceeded its deadline")
+
+def close():
+    """Closes every open client (pending keep-alive connections)."""
+    if _loop is None:
+        return
+    for provider in list(_providers.values()):
+        asyncio.run_coroutine_threadsafe(provider.aclose(), _loop).result(5)
@@ -0,0 +1,224 @@
+import bisect
+import difflib
+import re
+from collections import Counter
+
+import numpy as np
+
+NGRAM = 3
+# Word trigrams this frequent ("of the company") say nothing about position; skip them
+MAX_POSTINGS = 500
+# Alignments within this many words are treated as the same match (small edits, dropped words)
+ALIGN_SLACK = 2
+# Extra document words around the alignment the quote's words may fall into (insertions, gaps)
+GAP_WORDS = 3
+# Quotes shorter than this many words can't be verified meaningfully
+MIN_QUOTE_WORDS = 3
+NA_VALUES = ('', 'n/a', 'na', 'none', 'unknown', 'not available')
+
+WORD_RE = re.compile(r"\w+")
+# Comparison quotes often stitch passages from several documents together
+QUOTE_PARTS_RE = re.compile(r"\s*(?:;|…|\.\.\.|\n)\s*")
+
+def tokenize(text):
+    return WORD_RE.findall(text.lower())
+
+_MUL1 = np.uint64(0x9E3779B97F4A7C15)
+_MUL2 = np.uint64(0xC2B2AE3D27D4EB4F)
+
+def _gram_hashes(ids):
+    """64-bit hash of every word trigram in an array of word ids (wrapping arithmetic)."""
+    ids = ids.astype(np.uint64)
+    with np.errstate(over="ignore"):
+        return ids[:-2] * _MUL1 + ids[1:-1] * _MUL2 + ids[2:]
+
+class QuoteIndex:
+    """
+    Word-trigram index over one document, with page offsets.
+    find() looks up each trigram of the quote and votes for where the quote
+    would start in the document. The score is then the fraction of the
+    quote's words found in order in the document around that position, so an
+    inserted, dropped or changed word only costs that word. Cost depends on
+    the quote length and posting sizes, not on the document length.
+
+    Words are stored as int32 ids (`ids`, with `vocab` word -> id) and the
+    postings as trigram hashes sorted alongside their positions, about 16
+    bytes per word; bm25_index builds on the same ids.
+    """
+
+    def __init__(self, pages):
+        """pages: list of (page_number or None, text)."""
+        self.page_starts = []
+        self.page_numbers = []
+        self.vocab = {}
+        chunks = []
+        num_words = 0
+        for page_number, text in pages:
+            self.page_starts.append(num_words)
+            self.page_numbers.append(page_number)
+            words = tokenize(text or "")
+            chunks.append(np.fromiter((self.vocab.setdefault(w, len(self.vocab)) for w in words),
+                                      dtype=np.int32, count=len(words)))
+            num_words += len(words)
+        self.ids = np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int32)
+        self.num_words = num_words
+
+        hashes = _gram_hashes(self.ids) if num_words >= NGRAM else np.zeros(0, dtype=np.uint64)
+        order = np.argsort(hashes, kind="stable")
+        self.gram_hashes = hashes[order]
+        self.gram_positions = order.astype(np.int32)
+
+    @property
+    def nbytes(self):
+        """Approximate memory held by the index."""
+        # ~100 bytes per vocabulary entry (str object plus dict slot)
+        return self.ids.nbytes + self.gram_hashes.nbytes + self.gram_positions.nbytes + 100 * len(self.vocab)
+
+    def page_at(self, pos):
+        i = bisect.bisect_right(self.page_starts, pos) - 1
+        return self.page_numbers[i] if i >= 0 else None
+
+    def positions(self, gram_hash):
+        """Word positions where the trigram with this hash starts (sorted)."""
+        lo = np.searchsorted(self.gram_hashes, gram_hash, side="left")
+        hi = np.searchsorted(self.gram_hashes, gram_hash, side="right")
+        return self.gram_positions[lo:hi]
+
+    def find(self, quote):
+        """
+        Returns (score, page) for the best match of `quote`; score is 0..1.
+        Returns (None, None) if the quote is too short to check.
+        """
+        score, start = self.locate(quote)
+        if start is None:
+            return score, None
+        return score, self.page_at(start)
+
+    def locate(self, quote):
+        """Like find(), but returns (score, word position where the match starts)."""
+        words = tokenize(quote)
+        if len(words) < MIN_QUOTE_WORDS:
+            return None, None
+
+        # Words the document never uses can't be in any posting: id -1
+        ids = np.array([self.vocab.get(w, -1) for w in words], dtype=np.int64)
+        known = (ids[:-2] >= 0) & (ids[1:-1] >= 0) & (ids[2:] >= 0)
+        hashes = _gram_hashes(ids)
+        votes = Counter()
+        usable = 0
+        for offset in range(len(words) - NGRAM + 1):
+            if not known[offset]:
+                usable += 1
+                continue
+            positions = self.positions(hashes[offset])
+            if len(positions) > MAX_POSTINGS:
+                continue
+            usable += 1
+            for pos in positions.tolist():
+                votes[pos - offset] += 1
+
+        if not votes or not usable:
+            return 0.0, None
+
+        best_start, best_votes = None, 0
+        for start, _ in votes.most_common(10):
+            total = sum(votes.get(start + d, 0) for d in range(-ALIGN_SLACK, ALIGN_SLACK + 1))
+            if total > best_votes:
+                best_start, best_votes = start, total
+        best_start = max(0, best_start)
+        return self.coverage(ids, best_start), best_start
+
+    def coverage(self, ids, start):
+        """
+        Fraction of the quote's word ids found, in order, in the document
+        window aligned at `start` (with GAP_WORDS of slack on both sides and
+        room for inserted words). Single words stranded between edits don't
+        count, so scattered common words can't add up to a match.
+        """
+        lo = max(0, start - GAP_WORDS)
+        hi = min(self.num_words, start + len(ids) + len(ids) // 4 + GAP_WORDS)
+        matcher = difflib.SequenceMatcher(None, ids.tolist(), self.ids[lo:hi].tolist(), autojunk=False)
+        matched = sum(block.size for block in matcher.get_matching_blocks() if block.size >= 2)
+        return matched / len(ids)
+
+def quote_of(item):
+    meta = item.get("metadata") or {}
+    quote = meta.get("quote")
+    if isinstance(quote, list):
+        quote = "\n".join(str(q) for q in quote if q)
+    if not quote or str(quote).strip().lower() in NA_VALUES:
+        return None
+    return str(quote)
+
+def _best_match(quote, indexes):
+    """(score, page) of `quote` in whichever index matches it best; (None, None) if too short."""
+    best_score, best_page = None, None
+    for index in indexes:
+        score, page = index.find(quote)
+        if score is not None and (best_score is None or score > best_score):
+            best_score, best_page = score, page
+    return best_score, best_page
+
+def _parts_match(quote, indexes):
+    """
+    Scores a quote split on ";", "…", "..." and line breaks, each part matched
+    against any document; the score is the parts' average weighted by length.
+    """
+    parts = [part for part in QUOTE_PARTS_RE.split(quote) if len(tokenize(part)) >= MIN_QUOTE_WORDS]
+    if len(parts) < 2:
+        return None, None
+    total = weight = 0
+    first_page = None
+    for part in parts:
+        score, page = _best_match(part, indexes)
+        words = len(tokenize(part))
+        total += (score or 0.0) * words
+        weight += words
+        if first_page is None:
+            first_page = page
+    return total / weight, first_page
+
+def verify_cases(cases, indexes, mode="drop", threshold=0.6, correct_pages=True, split_quotes=False):
+    """
+    Checks each case's metadata.quote against the document index(es).
+    - verified quotes: page corrected to where the quote was found (single-document mode)
+    - unverifiable quotes: dropped (mode "drop") or kept with quote_verified=False ("flag")
+    Cases without a quote (e.g. "Not in document" questions) are kept unchanged.
+    With `split_quotes` (comparison mode) a quote may also verify part by part,
+    each part coming from any of the documents.
+    """
+    kept = []
+    dropped = corrected = 0
+    for item in cases:
+        quote = quote_of(item)
+        if quote is None:
+            kept.append(item)
+            continue
+
+        best_score, best_page = _best_match(quote, indexes)
+        if split_quotes and (best_score or 0.0) < threshold:
+            parts_score, parts_page = _parts_match(quote, indexes)
+            if parts_score is not None and parts_score > (best_score or 0.0):
+                best_score, best_page = parts_score, parts_page
+
+        if best_score is None:
+            kept.append(item)
+            continue
+
+        meta = item.setdefault("metadata", {})
+        if best_score >= threshold:
+            meta["quote_verified"] = True
+            stated = re.search(r"\d+", str(meta.get("page", "")))
+            if correct_pages and best_page is not None and (not stated or int(stated.group()) != best_page):
+                meta["page"] = str(best_page)
+                corrected += 1
+            kept.append(item)
+        elif mode == "flag":
+            meta["quote_verified"] = False
+            kept.append(item)
+        else:
+            dropped += 1
+
+    if dropped or corrected:
+        print(f"  - Quote check: {dropped} unverifiable case(s) dropped, {corrected} page number(s) corrected.")
+    return kept
@@ -0,0 +1,157 @@
+import time
+
+import json_codec
+
+# Keys a streamed event may carry its text under, in order of preference
+TEXT_KEYS = ("summary", "delta", "token", "content", "text", "answer")
+# Keys whose text is always just the new part of the answer
+DELTA_KEYS = ("delta", "token")
+
+def _event_piece(payload):
+    """
+    Pulls the text piece out of one decoded stream event: (text, kind), where
+    kind is "delta" (new text only), "full" (the whole answer so far) or None
+    when the event doesn't say. Handles plain strings (deltas),
+    {"summary": ...}-style events and OpenAI-style
+    {"choices": [{"delta": {"content": ...}}]} events.
+    """
+    if isinstance(payload, str):
+        return payload, "delta"
+    if not isinstance(payload, dict):
+        return None, None
+
+    choices = payload.get("choices")
+    if isinstance(choices, list) and choices:
+        for key, kind in (("delta", "delta"), ("message", "full")):
+            value = choices[0].get(key)
+            if isinstance(value, dict) and value.get("content"):
+                return value["content"], kind
+
+    for key in TEXT_KEYS:
+        value = payload.get(key)
+        kind = "delta" if key in DELTA_KEYS else None
+        if isinstance(value, str):
+            return value, kind
+        if isinstance(value, dict):
+            nested, nested_kind = _event_piece(value)
+            if nested:
+                return nested, nested_kind or kind
+    return None, None
+
+def _event_text(payload):
+    return _event_piece(payload)[0]
+
+def _decode(data):
+    try:
+        decoded = json_codec.loads(data)
+    except ValueError:
+        return data
+    # A bare number or literal ("1", "true") is answer text, not an event
+    return decoded if isinstance(decoded, (dict, str)) else data
+
+def _iter_events(response):
+    """
+    Yields decoded events from an SSE, NDJSON or plain chunked response.
+    Plain chunked bodies are yielded as raw text pieces.
+    """
+    content_type = response.headers.get("Content-Type", "").lower()
+    if "text/event-stream" in content_type or "charset" not in content_type:
+        # SSE and JSON are UTF-8; requests would fall back to ISO-8859-1 for text/*
+        response.encoding = "utf-8"
+
+    if "text/event-stream" in content_type:
+        data_lines = []
+        for line in response.iter_lines(decode_unicode=True):
+            if line is None:
+                continue
+            if line == "":
+                # Blank line terminates one SSE event
+                if data_lines:
+                    data = "\n".join(data_lines)
+                    data_lines = []
+                    if data.strip() == "[DONE]":
+                        return
+                    yield _decode(data)
+                continue
+            if line.startswith("data:"):
+                data_lines.append(line[5:].lstrip(" "))
+        if data_lines:
+            data = "\n".join(data_lines)
+            if data.strip() != "[DONE]":
+                yield _decode(data)
+
+    elif "ndjson" in content_type or "jsonl" in content_type:
+        for line in response.iter_lines(decode_unicode=True):
+            if line and line.strip():
+                yield _decode(line)
+
+    else:
+        for chunk in response.iter_content(chunk_size=None, decode_unicode=True):
+            if chunk:
+                yield chunk if isinstance(chunk, str) else chunk.decode("utf-8", errors="replace")
+
+def read_rag_stream(response, started, deadline=None):
+    """
+    Reads a streaming RAG response incrementally and rebuilds the 'summary' field.
+    `started` is the time.perf_counter() value taken just before the request was sent.
+    `deadline` (a deadline.Deadline) stops reading a stream that trickles on past it.
+
+    Returns a dict shaped like the buffered response plus timing fields:
+        {"summary": ..., "ttft": seconds, "tokens_per_sec": float, "latency": seconds}
+    Token counts are approximated by whitespace-separated words.
+
+    Some backends send deltas, others resend the whole answer so far. That is
+    decided once per stream: from the event key when it says, else from the
+    first two pieces (cumulative if the second extends the first).
+    """
+    content_type = response.headers.get("Content-Type", "").lower()
+    is_raw = not ("text/event-stream" in content_type or "ndjson" in content_type or "jsonl" in content_type)
+
+    summary = ""
+    raw_body = []
+    first_token_at = None
+    mode = None  # "delta" or "full", once known
+    pieces = 0
+
+    for event in _iter_events(response):
+        if deadline is not None:
+            deadline.check()
+        if is_raw:
+            raw_body.append(event)
+            piece = event
+        else:
+            piece, kind = _event_piece(event)
+        if not piece:
+            continue
+        if first_token_at is None:
+            first_token_at = time.perf_counter()
+        if is_raw:
+            continue
+        pieces += 1
+        if mode is None:
+            if kind is not None:
+                mode = kind
+            elif pieces == 2:
+                mode = "full" if len(piece) > len(summary) and piece.startswith(summary) else "delta"
+        summary = piece if mode == "full" else summary + piece
+
+    finished_at = time.perf_counter()
+
+    if is_raw:
+        # Chunked but not framed: the body is one JSON document (or plain text)
+        body = "".join(raw_body)
+        decoded = _decode(body)
+        summary = _event_text(decoded) if isinstance(decoded, dict) else body
+        summary = summary or body
+
+    ttft = (first_token_at - started) if first_token_at else None
+    generation_time = (finished_at - first_token_at) if first_token_at else 0
+    num_tokens = len(summary.split())
+    tokens_per_sec = (num_tokens / generation_time) if generation_time > 0 else None
+
+    return {
+        "summary": summary,
+        "ttft": round(ttft, 3) if ttft is not None else None,
+        "tokens_per_sec": round(tokens_per_sec, 1) if tokens_per_sec is not None else None,
+        "latency": round(finished_at - started, 3)
+    }
@@ -0,0 +1,229 @@
+import csv
+import itertools
+import os
+import re
+import numpy as np
+
+# Excel refuses cells longer than this and sheet names longer than 31 chars
+EXCEL_MAX_CELL = 32767
+EXCEL_MAX_SHEET_NAME = 31
+INVALID_SHEET_CHARS = re.compile(r"[\[\]:*?/\\]")
+# Control characters openpyxl rejects in cell values
+ILLEGAL_CHARS = re.compile(r"[\000-\010]|[\013-\014]|[\016-\037]")
+
+def _cell(value):
+    if isinstance(value, str):
+        value = ILLEGAL_CHARS.sub("", value)
+        if len(value) > EXCEL_MAX_CELL:
+            value = value[:EXCEL_MAX_CELL - 3] + "..."
+        return value
+    if isinstance(value, (list, dict)):
+        return _cell(str(value))
+    return value
+
+def _sheet_title(name, used):
+    """Makes a valid, unique worksheet title from a file name."""
+    base = INVALID_SHEET_CHARS.sub("_", name).strip("'") or "Sheet"
+    base = base[:EXCEL_MAX_SHEET_NAME]
+    title = base
+    n = 2
+    while title.lower() in used:
+        suffix = f" ({n})"
+        title = base[:EXCEL_MAX_SHEET_NAME - len(suffix)] + suffix
+        n += 1
+    used.add(title.lower())
+    return title
+
+def accuracy_summary(table):
+    """
+    Per-file status counts computed from the table's categorical codes.
+    Multi-target runs (a "Target" column) get one row per file and target.
+    Returns (header, rows); the last row(s) are the overall total, one per target.
+    """
+    file_codes, files = table.codes("Filename")
+    status_codes, statuses = table.codes("Status")
+    if "Target" in table.columns:
+        target_codes, targets = table.codes("Target")
+        targets = list(targets) + [""]  # extra slot for missing target
+        target_codes = np.where(target_codes >= 0, target_codes, len(targets) - 1)
+    else:
+        target_codes, targets = np.zeros(len(file_codes), dtype=np.int64), None
+
+    # One bincount over (file, target, status) triples instead of a pandas pivot
+    num_targets = len(targets) if targets else 1
+    num_statuses = len(statuses) + 1  # extra slot for missing status
+    groups = file_codes.astype(np.int64) * num_targets + target_codes
+    triples = groups * num_statuses + np.where(status_codes >= 0, status_codes, len(statuses))
+    valid = file_codes >= 0
+    counts = np.bincount(triples[valid], minlength=len(files) * num_targets * num_statuses)
+    counts = counts.reshape(len(files), num_targets, num_statuses)[:, :, :len(statuses)]
+
+    header = ["File"] + (["Target"] if targets else []) + ["Total"] + list(statuses) + ["Accuracy (Fully Correct %)"]
+    fully_idx = statuses.index("Fully Correct") if "Fully Correct" in statuses else None
+
+    def summary_row(names, row_counts):
+        total = int(row_counts.sum())
+        fully = int(row_counts[fully_idx]) if fully_idx is not None else 0
+        accuracy = round(100.0 * fully / total, 1) if total else 0.0
+        return names + [total] + [int(c) for c in row_counts] + [accuracy]
+
+    if not targets:
+        rows = [summary_row([name], counts[k, 0]) for k, name in enumerate(files)]
+        rows.append(summary_row(["ALL FILES"], counts.sum(axis=(0, 1))))
+        return header, rows
+
+    rows = [summary_row([name, target], counts[k, t])
+            for k, name in enumerate(files) for t, target in enumerate(targets) if counts[k, t].any()]
+    totals = counts.sum(axis=0)
+    rows += [summary_row(["ALL FILES", target], totals[t]) for t, target in enumerate(targets) if totals[t].any()]
+    return header, rows
+
+# Better verdicts rank higher when targets are compared question by question
+STATUS_RANK = {"fully correct": 3, "partially correct": 2, "not answered": 1, "wrongly answered": 0}
+
+def _rank(status):
+    return STATUS_RANK.get(str(status).strip().lower(), 0)
+
+def ab_comparison(table):
+    """
+    Side-by-side view of a multi-target run (rows carry a "Target" column).
+    Returns (summary_header, summary_rows, header, rows):
+    - summary: per target, accuracy plus questions better/worse/same than the first target
+    - rows: one per question with each target's status and response next to each other
+    """
+    names = ["Filename", "Question", "Expected Answer", "Target", "Status", "RAG Response"]
+    targets = list(dict.fromkeys(table.column("Target")))
+    questions = {}
+    for filename, question, expected, target, status, response in table.iter_rows(names):
+        entry = questions.setdefault((filename, question), {"expected": expected, "targets": {}})
+        entry["targets"][target] = (status, response)
+
+    baseline = targets[0]
+    summary_header = ["Target", "Questions", "Fully Correct", "Accuracy (Fully Correct %)",
+                      f"Better than {baseline}", f"Worse than {baseline}", "Same"]
+    summary_rows = []
+    for target in targets:
+        answered = [e["targets"] for e in questions.values() if target in e["targets"]]
+        fully = sum(1 for t in answered if t[target][0] == "Fully Correct")
+        better = worse = same = 0
+        for t in answered:
+            if baseline not in t:
+                continue
+            diff = _rank(t[target][0]) - _rank(t[baseline][0])
+            better += diff > 0
+            worse += diff < 0
+            same += diff == 0
+        accuracy = round(100.0 * fully / len(answered), 1) if answered else 0.0
+        summary_rows.append([target, len(answered), fully, accuracy, better, worse, same])
+
+    header = ["Filename", "Question", "Expected Answer"]
+    for target in targets:
+        header += [f"Status [{target}]", f"RAG Response [{target}]"]
+    header.append("Best")
+    rows = []
+    for (filename, question), entry in questions.items():
+        row = [filename, question, entry["expected"]]
+        ranks = {}
+        for target in targets:
+            status, response = entry["targets"].get(target, ("", ""))
+            row += [status, response]
+            if target in entry["targets"]:
+                ranks[target] = _rank(status)
+        top = max(ranks.values()) if ranks else 0
+        leaders = [t for t, r in ranks.items() if r == top]
+        row.append("Same" if len(leaders) == len(ranks) else ", ".join(leaders))
+        rows.append(row)
+    return summary_header, summary_rows, header, rows
+
+def _excel_sheets(table):
+    """Yields (title, rows) for every worksheet, in order, with cell values already cleaned."""
+    names = list(table.columns)
+    used_titles = set()
+
+    header, rows = accuracy_summary(table)
+    yield _sheet_title("Summary", used_titles), [header] + rows
+
+    if "Target" in table.columns:
+        summary_header, summary_rows, header, rows = ab_comparison(table)
+        ab_rows = [summary_header] + summary_rows + [[]] + [header] + rows
+        yield _sheet_title("A-B", used_titles), ([_cell(v) for v in row] for row in ab_rows)
+
+    file_codes, files = table.codes("Filename")
+    for k, name in enumerate(files):
+        rows = table.iter_rows(names, np.flatnonzero(file_codes == k), convert=_cell)
+        yield _sheet_title(name, used_titles), itertools.chain([names], rows)
+
+def write_excel(table, output_file):
+    """
+    Writes a streaming workbook: a Summary sheet with accuracy per file, then
+    one sheet per file. With xlsxwriter installed it runs in constant_memory
+    mode (each row goes straight to disk, several times faster than openpyxl);
+    otherwise openpyxl's write-only workbook is used. Either way memory stays
+    bounded regardless of row count.
+    """
+    try:
+        import xlsxwriter
+    except ImportError:
+        xlsxwriter = None
+
+    if xlsxwriter is None:
+        from openpyxl import Workbook
+        wb = Workbook(write_only=True)
+        for title, rows in _excel_sheets(table):
+            ws = wb.create_sheet(title)
+            for row in rows:
+                ws.append(row)
+        wb.save(output_file)
+        return
+
+    # Answers are plain text: never turn "=..." into formulas or "http..." into links
+    wb = xlsxwriter.Workbook(output_file, {"constant_memory": True, "strings_to_formulas": False,
+                                           "strings_to_urls": False})
+    try:
+        for title, rows in _excel_sheets(table):
+            ws = wb.add_worksheet(title)
+            for r, row in enumerate(rows):
+                ws.write_row(r, 0, row)
+    finally:
+        wb.close()
+
+def write_csv(table, output_file):
+    """Writes all rows to one CSV file, decoding column slices in bulk."""
+    names = list(table.columns)
+    with open(output_file, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f)
+        writer.writerow(names)
+        writer.writerows(table.iter_rows(names))
+
+def write_parquet(table, output_file):
+    """Writes the table through Arrow (requires pyarrow)."""
+    import pyarrow.parquet as pq
+    pq.write_table(table.to_arrow(), output_file, compression="zstd")
+
+WRITERS = {
+    "xlsx": write_excel,
+    "csv": write_csv,
+    "parquet": write_parquet
+}
+
+def write_report(table, output_base="rag_test_results", fmt="xlsx"):
+    """
+    Writes the results table as xlsx (default), csv or parquet.
+    Returns the path written, or None if the format is unknown.
+    """
+    fmt = fmt.lower().lstrip(".")
+    writer = WRITERS.get(fmt)
+    if writer is None:
+        print(f"Unknown report format '{fmt}'. Use one of: {', '.join(WRITERS)}")
+        return None
+
+    output_file = f"{os.path.splitext(output_base)[0]}.{fmt}"
+    writer(table, output_file)
+    if fmt != "xlsx" and "Target" in table.columns:
+        # The workbook has an A-B sheet; other formats get the same view as a separate CSV
+        ab_file = f"{os.path.splitext(output_base)[0]}_ab.csv"
+        summary_header, summary_rows, header, rows = ab_comparison(table)
+        with open(ab_file, "w", newline="", encoding="utf-8-sig") as f:
+            csv.writer(f).writerows([summary_header] + summary_rows + [[]] + [header] + rows)
+        print(f"A/B comparison saved to {ab_file}")
+    return output_file
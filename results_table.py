@@ -0,0 +1,276 @@
+import numpy as np
+
+# Columns with few distinct values are stored as int32 codes into a category list
+CATEGORICAL_COLUMNS = ("Filename", "S3_URI", "Status", "Comparison Type", "Change", "Previous Status",
+                       "Quote Verified", "Retrievable", "Difficulty", "Target")
+# Columns stored as float64 (missing -> NaN)
+NUMERIC_COLUMNS = ("TTFT (s)", "Tokens/s", "BM25 Rank")
+
+INITIAL_CAPACITY = 1024
+# Rows decoded at once by iter_rows: whole column slices, without building every row up front
+CHUNK_ROWS = 8192
+
+class _Buffer:
+    """
+    Growable NumPy buffer. Capacity doubles when full, so appends are amortised O(1).
+    view() returns a slice of the live array; after a later grow the old view
+    keeps pointing at the old memory, so exported frames stay valid.
+    """
+
+    def __init__(self, dtype, fill):
+        self.data = np.empty(INITIAL_CAPACITY, dtype=dtype)
+        self.fill = fill
+        self.size = 0
+
+    def _reserve(self, extra):
+        needed = self.size + extra
+        if needed <= len(self.data):
+            return
+        capacity = len(self.data)
+        while capacity < needed:
+            capacity *= 2
+        grown = np.empty(capacity, dtype=self.data.dtype)
+        grown[:self.size] = self.data[:self.size]
+        self.data = grown
+
+    def append(self, value):
+        self._reserve(1)
+        self.data[self.size] = value
+        self.size += 1
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=self.data.dtype)
+        self._reserve(len(values))
+        self.data[self.size:self.size + len(values)] = values
+        self.size += len(values)
+
+    def pad(self, count):
+        self.extend(np.full(count, self.fill, dtype=self.data.dtype))
+
+    def view(self):
+        return self.data[:self.size]
+
+class _CategoricalColumn:
+    kind = "categorical"
+
+    def __init__(self):
+        self.categories = []
+        self.index = {}
+        self.codes = _Buffer(np.int32, -1)
+
+    def code_for(self, value):
+        if value is None:
+            return -1
+        value = str(value)
+        code = self.index.get(value)
+        if code is None:
+            code = len(self.categories)
+            self.categories.append(value)
+            self.index[value] = code
+        return code
+
+    def append(self, value):
+        self.codes.append(self.code_for(value))
+
+    def pad(self, count):
+        self.codes.pad(count)
+
+    def extend_from(self, other):
+        mapping = np.array([self.code_for(c) for c in other.categories] or [-1], dtype=np.int32)
+        codes = other.codes.view()
+        self.codes.extend(np.where(codes >= 0, mapping[np.maximum(codes, 0)], -1))
+
+    def get(self, i):
+        code = self.codes.data[i]
+        return self.categories[code] if code >= 0 else None
+
+    def values(self):
+        categories = self.categories
+        return [categories[c] if c >= 0 else None for c in self.codes.view().tolist()]
+
+    def take(self, indices, convert=None):
+        # Each category is converted once; code -1 picks the trailing None
+        categories = self.categories if convert is None else [convert(c) for c in self.categories]
+        lookup = np.array(categories + [None], dtype=object)
+        return lookup[self.codes.view()[indices]].tolist()
+
+class _NumericColumn:
+    kind = "numeric"
+
+    def __init__(self):
+        self.buffer = _Buffer(np.float64, np.nan)
+
+    def append(self, value):
+        self.buffer.append(np.nan if value is None else value)
+
+    def pad(self, count):
+        self.buffer.pad(count)
+
+    def extend_from(self, other):
+        self.buffer.extend(other.buffer.view())
+
+    def get(self, i):
+        value = self.buffer.data[i]
+        return None if np.isnan(value) else float(value)
+
+    def values(self):
+        return [None if v != v else v for v in self.buffer.view().tolist()]
+
+    def take(self, indices, convert=None):
+        values = self.buffer.view()[indices]
+        out = values.astype(object)
+        out[np.isnan(values)] = None
+        return out.tolist()
+
+class _TextColumn:
+    kind = "text"
+
+    def __init__(self):
+        self.items = []
+
+    def append(self, value):
+        self.items.append(value)
+
+    def pad(self, count):
+        self.items.extend([None] * count)
+
+    def extend_from(self, other):
+        self.items.extend(other.items)
+
+    def get(self, i):
+        return self.items[i]
+
+    def values(self):
+        return list(self.items)
+
+    def take(self, indices, convert=None):
+        items = self.items
+        if convert is None:
+            return [items[i] for i in indices.tolist()]
+        return [convert(items[i]) for i in indices.tolist()]
+
+def _new_column(name):
+    if name in CATEGORICAL_COLUMNS:
+        return _CategoricalColumn()
+    if name in NUMERIC_COLUMNS:
+        return _NumericColumn()
+    return _TextColumn()
+
+class ResultTable:
+    """
+    Column-oriented store for result rows.
+    Filename, URI, status and comparison type are kept as categorical codes,
+    so repeated strings cost 4 bytes per row instead of a dict entry.
+    Rows are appended as dicts; columns appear in first-seen order and
+    missing values are filled with None/NaN.
+    """
+
+    def __init__(self, rows=None):
+        self.columns = {}
+        self.num_rows = 0
+        if rows:
+            for row in rows:
+                self.append(row)
+
+    def __len__(self):
+        return self.num_rows
+
+    def _column(self, name):
+        column = self.columns.get(name)
+        if column is None:
+            column = _new_column(name)
+            column.pad(self.num_rows)
+            self.columns[name] = column
+        return column
+
+    def append(self, row):
+        for name, value in row.items():
+            self._column(name).append(value)
+        for name, column in self.columns.items():
+            if name not in row:
+                column.pad(1)
+        self.num_rows += 1
+
+    def extend(self, other):
+        """Appends every row of another ResultTable (or an iterable of row dicts)."""
+        if not isinstance(other, ResultTable):
+            for row in other:
+                self.append(row)
+            return
+        for name, column in other.columns.items():
+            self._column(name).extend_from(column)
+        for name, column in self.columns.items():
+            if name not in other.columns:
+                column.pad(other.num_rows)
+        self.num_rows += other.num_rows
+
+    def column(self, name):
+        """Python list of one column's values."""
+        return self.columns[name].values()
+
+    def row(self, i):
+        return {name: column.get(i) for name, column in self.columns.items()}
+
+    def __iter__(self):
+        for i in range(self.num_rows):
+            yield self.row(i)
+
+    def codes(self, name):
+        """(codes, categories) of a categorical column; code -1 means missing."""
+        column = self.columns[name]
+        return column.codes.view(), column.categories
+
+    def iter_rows(self, names, indices=None, convert=None):
+        """
+        Yields row tuples for the given columns, optionally only for `indices`.
+        Columns are decoded CHUNK_ROWS at a time as whole slices, so nothing
+        row-shaped is built up front. `convert` is applied to every
+        non-numeric value (once per category for categorical columns).
+        """
+        columns = [self.columns[name] for name in names]
+        indices = np.arange(self.num_rows) if indices is None else np.asarray(indices, dtype=np.int64)
+        for start in range(0, len(indices), CHUNK_ROWS):
+            part = indices[start:start + CHUNK_ROWS]
+            yield from zip(*(column.take(part, convert) for column in columns))
+
+    def to_rows(self, names):
+        """List of row lists for the given columns (None -> ""), e.g. for Sheets uploads."""
+        columns = [self.column(name) for name in names]
+        return [["" if v is None else v for v in row] for row in zip(*columns)]
+
+    def to_pandas(self):
+        """
+        Builds a DataFrame. Categorical and numeric columns wrap the table's
+        NumPy buffers directly instead of copying them.
+        """
+        import pandas as pd
+
+        data = {}
+        for name, column in self.columns.items():
+            if column.kind == "categorical":
+                data[name] = pd.Categorical.from_codes(column.codes.view(), categories=column.categories)
+            elif column.kind == "numeric":
+                data[name] = pd.Series(column.buffer.view(), copy=False)
+            else:
+                data[name] = column.items
+        return pd.DataFrame(data, copy=False)
+
+    def to_arrow(self):
+        """Builds a pyarrow Table (categorical columns become dictionary arrays)."""
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise ImportError("pyarrow is required for ResultTable.to_arrow(): pip install pyarrow")
+
+        arrays = []
+        for column in self.columns.values():
+            if column.kind == "categorical":
+                codes = column.codes.view()
+                indices = pa.array(codes, mask=codes < 0)
+                arrays.append(pa.DictionaryArray.from_arrays(indices, pa.array(column.categories, type=pa.string())))
+            elif column.kind == "numeric":
+                values = column.buffer.view()
+                arrays.append(pa.array(values, mask=np.isnan(values)))
+            else:
+                arrays.append(pa.array([None if v is None else str(v) for v in column.items], type=pa.string()))
+        return pa.Table.from_arrays(arrays, names=list(self.columns))
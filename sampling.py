@@ -0,0 +1,154 @@
+import math
+import random
+import threading
+from collections import Counter
+from statistics import NormalDist
+
+STATUSES = ("Fully Correct", "Partially Correct", "Wrongly Answered", "Not Answered")
+# The judge's casing varies ("Partially correct", "not answered"); count them as one
+CANONICAL = {status.lower(): status for status in STATUSES}
+
+def stratum_of(item, document):
+    """(document, question type): the generator's question/comparison type, else BM25 difficulty."""
+    meta = item.get("metadata") or {}
+    kind = meta.get("question_type") or meta.get("comparison_type") or meta.get("difficulty") or "unknown"
+    return document, str(kind).strip().lower()
+
+class Estimator:
+    """
+    Stratified estimate of each status rate with a confidence margin.
+    Each stratum is weighted by how many questions it holds (N_h); within a
+    stratum the variance uses add-one smoothing, so a few identical verdicts
+    don't look certain, and a finite-population correction, so a fully
+    judged stratum contributes no uncertainty. Shared across threads.
+    When shared by several documents, expect() how many will register; the
+    margin stays open until all of them have, so no document stops on an
+    estimate that is missing strata.
+    """
+
+    def __init__(self, confidence=0.95):
+        self.z = NormalDist().inv_cdf((1 + confidence) / 2)
+        self.sizes = Counter()
+        self.counts = {}
+        self.documents = set()
+        self.expected = 0
+        self.lock = threading.Lock()
+
+    def expect(self, documents):
+        with self.lock:
+            self.expected += documents
+
+    def add_document(self, document, items):
+        """Registers a document's strata (once; a document without questions registers none)."""
+        sizes = Counter(stratum_of(item, document) for item in items)
+        with self.lock:
+            if document in self.documents:
+                return
+            self.documents.add(document)
+            self.expected = max(0, self.expected - 1)
+            for key, size in sizes.items():
+                self.sizes[key] += size
+                self.counts.setdefault(key, Counter())
+
+    def record(self, key, status):
+        status = CANONICAL.get(str(status).strip().lower(), status)
+        with self.lock:
+            self.counts[key][status] += 1
+
+    def sampled(self, key=None):
+        with self.lock:
+            if key is not None:
+                return sum(self.counts[key].values())
+            return sum(sum(c.values()) for c in self.counts.values())
+
+    def intervals(self):
+        """{status: (rate, margin)}; margin is inf while any stratum is still unsampled."""
+        with self.lock:
+            total = sum(self.sizes.values())
+            result = {}
+            for status in STATUSES:
+                rate = variance = 0.0
+                for key, size in self.sizes.items():
+                    n = sum(self.counts[key].values())
+                    if n == 0:
+                        variance = math.inf
+                        continue
+                    weight = size / total
+                    hits = self.counts[key][status]
+                    rate += weight * hits / n
+                    smoothed = (hits + 1) / (n + 2)
+                    variance += weight ** 2 * smoothed * (1 - smoothed) / n * max(0.0, 1 - n / size)
+                result[status] = (rate, self.z * math.sqrt(variance))
+            return result
+
+    def margin(self):
+        with self.lock:
+            if self.expected or not self.sizes:
+                return math.inf
+        return max(m for _, m in self.intervals().values())
+
+    def describe(self):
+        return ", ".join(f"{status} {100 * rate:.1f}% ±{100 * m:.1f}"
+                         for status, (rate, m) in self.intervals().items() if not math.isinf(m))
+
+class SequentialSampler:
+    """
+    Picks questions in batches, spread over strata in proportion to their
+    size (random order within a stratum), and stops once the estimator's
+    margin is within `margin` and every stratum has `min_per_stratum`
+    verdicts, or when the questions run out.
+
+        for batch in sampler.batches():       # [(index, item), ...]
+            ... query and judge ...
+            sampler.record(item, status)
+    """
+
+    def __init__(self, items, document, estimator, margin, min_per_stratum=2, batch_size=4, seed=None):
+        self.estimator = estimator
+        self.margin = margin
+        self.min_per_stratum = min_per_stratum
+        self.batch_size = max(1, batch_size)
+        self.document = document
+        self.total = len(items)
+        self.taken = 0
+        rng = random.Random(seed)
+        self.pending = {}
+        for index, item in enumerate(items):
+            self.pending.setdefault(stratum_of(item, document), []).append((index, item))
+        self.sizes = {}
+        for key, entries in self.pending.items():
+            rng.shuffle(entries)
+            self.sizes[key] = len(entries)
+        estimator.add_document(document, items)
+        self.drawn = Counter()
+
+    def _next(self):
+        # Stratum furthest behind its proportional share of the draws so far
+        open_keys = [key for key, entries in self.pending.items() if entries]
+        if not open_keys:
+            return None
+        key = max(open_keys, key=lambda k: self.sizes[k] * (self.taken + 1) / self.total - self.drawn[k])
+        self.drawn[key] += 1
+        self.taken += 1
+        return self.pending[key].pop()
+
+    def settled(self):
+        for key, size in self.sizes.items():
+            if self.estimator.sampled(key) < min(self.min_per_stratum, size):
+                return False
+        return self.estimator.margin() <= self.margin
+
+    def batches(self):
+        while self.taken < self.total and not self.settled():
+            batch = []
+            while len(batch) < self.batch_size:
+                entry = self._next()
+                if entry is None:
+                    break
+                batch.append(entry)
+            if not batch:
+                return
+            yield batch
+
+    def record(self, item, status):
+        self.estimator.record(stratum_of(item, self.document), status)
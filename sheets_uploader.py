@@ -1,8 +1,11 @@
-import gspread
-import pandas as pd
 import config
 import os
+import queue
 import random
+import threading
+import time
+
+import deadline
 
 # Global variable to track active model
 ACTIVE_MODEL_NAME = None
@@ -12,136 +15,174 @@ def set_active_model(model_name):
     global ACTIVE_MODEL_NAME
     ACTIVE_MODEL_NAME = model_name
 
+# Result columns uploaded to Sheets, in order, and their Sheet headers
+# ('Target' only appears in multi-target runs, so each answer's endpoint is visible)
+COLUMN_MAPPING = {
+    'Page/Section': 'REFERENCE',
+    'Question': 'QUERY',
+    'Target': 'TARGET',
+    'Status': 'STATUS',
+    'Expected Answer': 'Expected Response',
+    'RAG Response': 'Generated Response'
+}
+
+def _columns(available):
+    """Result columns to upload: all of COLUMN_MAPPING, 'Target' only when the rows have it."""
+    return [c for c in COLUMN_MAPPING if c != 'Target' or 'Target' in available]
+
+def _table_name():
+    model = ACTIVE_MODEL_NAME if ACTIVE_MODEL_NAME else 'claude'
+    model = model.replace('-', '_').replace('.', '_')
+    random_num = random.randint(100, 999)
+    return f"metta_table_1_{model}_{random_num}"
+
+def _gspread():
+    """gspread is only imported once a sheet is actually written."""
+    import gspread
+    return gspread
+
+def _open_spreadsheet():
+    """Opens config.GOOGLE_SHEET_ID with the service account, or returns None if there are no credentials."""
+    creds_dir = os.path.join(os.path.expanduser("~"), "AppData", "Roaming", "gspread")
+    service_account = os.path.join(creds_dir, "service_account.json")
+    if not os.path.exists(service_account):
+        return None
+
+    gc = _gspread().service_account(filename=service_account)
+    return gc.open_by_key(config.GOOGLE_SHEET_ID)
+
+def _format_requests(worksheet_id, header, num_rows, table_name):
+    """
+    batch_update requests that turn the written range into a native Table with
+    STATUS dropdown chips, a dark green header, column widths and wrapping.
+    """
+    num_cols = len(header)
+    status_col_idx = header.index("STATUS")
+    requests = []
+
+    # A. Create Native Table with Explicit Column Indices
+    column_props = []
+    for i, col_name in enumerate(header):
+        column_props.append({
+            "columnIndex": i,
+            "columnName": col_name
+        })
+
+    requests.append({
+        "addTable": {
+            "table": {
+                "name": table_name,
+                "range": {
+                    "sheetId": worksheet_id,
+                    "startRowIndex": 0, "endRowIndex": num_rows,
+                    "startColumnIndex": 0, "endColumnIndex": num_cols
+                },
+                "columnProperties": column_props
+            }
+        }
+    })
+
+    # B. Convert STATUS column to Dropdown "Chips"
+    requests.append({
+        "setDataValidation": {
+            "range": {
+                "sheetId": worksheet_id,
+                "startRowIndex": 1, "endRowIndex": num_rows,
+                "startColumnIndex": status_col_idx, "endColumnIndex": status_col_idx + 1
+            },
+            "rule": {
+                "condition": {
+                    "type": "ONE_OF_LIST",
+                    "values": [
+                        {"userEnteredValue": "Fully Correct"},
+                        {"userEnteredValue": "Partially correct"},
+                        {"userEnteredValue": "Wrongly answered"},
+                        {"userEnteredValue": "not answered"},
+                        {"userEnteredValue": deadline.TIMED_OUT}
+                    ]
+                },
+                "showCustomUi": True, "strict": True
+            }
+        }
+    })
+
+    # C. Header Styling (Dark Green background + White bold text)
+    requests.append({
+        "repeatCell": {
+            "range": {"sheetId": worksheet_id, "startRowIndex": 0, "endRowIndex": 1, "startColumnIndex": 0, "endColumnIndex": num_cols},
+            "cell": {
+                "userEnteredFormat": {
+                    "backgroundColor": {"red": 0.12, "green": 0.33, "blue": 0.25},
+                    "textFormat": {"foregroundColor": {"red": 1, "green": 1, "blue": 1}, "bold": True},
+                    "horizontalAlignment": "CENTER", "verticalAlignment": "MIDDLE"
+                }
+            },
+            "fields": "userEnteredFormat(backgroundColor,textFormat,horizontalAlignment,verticalAlignment)"
+        }
+    })
+
+    # D. Column Widths and Text Wrapping
+    col_widths = {"REFERENCE": 180, "QUERY": 300, "TARGET": 150, "STATUS": 150,
+                  "Expected Response": 450, "Generated Response": 450}
+    for i, col_name in enumerate(header):
+        width = col_widths.get(col_name)
+        if width:
+            requests.append({
+                "updateDimensionProperties": {
+                    "range": {"sheetId": worksheet_id, "dimension": "COLUMNS", "startIndex": i, "endIndex": i + 1},
+                    "properties": {"pixelSize": width},
+                    "fields": "pixelSize"
+                }
+            })
+
+    # Enable text wrapping for better readability
+    requests.append({
+        "repeatCell": {
+            "range": {"sheetId": worksheet_id, "startRowIndex": 1, "endRowIndex": num_rows, "startColumnIndex": 0, "endColumnIndex": num_cols},
+            "cell": {"userEnteredFormat": {"wrapStrategy": "WRAP", "verticalAlignment": "TOP"}},
+            "fields": "userEnteredFormat(wrapStrategy,verticalAlignment)"
+        }
+    })
+
+    return requests
+
 def upload_to_google_sheets(df, sheet_name):
     """
     Uploads data and converts it to a native 2024 Google Sheets Table.
     Includes dropdown chips (uncolored) and professional formatting.
+    `df` may be a pandas DataFrame or a results_table.ResultTable.
     """
     try:
         # 1. Setup Table and Column Names
-        model = ACTIVE_MODEL_NAME if ACTIVE_MODEL_NAME else 'claude'
-        model = model.replace('-', '_').replace('.', '_')
-        random_num = random.randint(100, 999)
-        table_name = f"metta_table_1_{model}_{random_num}"
+        table_name = _table_name()
         
-        mapping = {
-            'Page/Section': 'REFERENCE',
-            'Question': 'QUERY',
-            'Status': 'STATUS',
-            'Expected Answer': 'Expected Response',
-            'RAG Response': 'Generated Response'
-        }
-        
-        existing_cols = [c for c in mapping.keys() if c in df.columns]
-        upload_df = df[existing_cols].rename(columns=mapping)
+        existing_cols = [c for c in _columns(df.columns) if c in df.columns]
+        header = [COLUMN_MAPPING[c] for c in existing_cols]
+        if hasattr(df, "to_rows"):
+            # ResultTable: read the columns directly, no DataFrame needed
+            rows = df.to_rows(existing_cols)
+        else:
+            rows = df[existing_cols].values.tolist()
 
         # 2. Authenticate
-        creds_dir = os.path.join(os.path.expanduser("~"), "AppData", "Roaming", "gspread")
-        service_account = os.path.join(creds_dir, "service_account.json")
-        if not os.path.exists(service_account):
+        sh = _open_spreadsheet()
+        if sh is None:
             return False
-
-        gc = gspread.service_account(filename=service_account)
-        sh = gc.open_by_key(config.GOOGLE_SHEET_ID)
         
         try:
             worksheet = sh.worksheet(sheet_name)
             worksheet.clear()
-        except gspread.exceptions.WorksheetNotFound:
+        except _gspread().exceptions.WorksheetNotFound:
             worksheet = sh.add_worksheet(title=sheet_name, rows=100, cols=10)
         
         # 3. Write Data
-        values = [upload_df.columns.values.tolist()] + upload_df.values.tolist()
+        values = [header] + rows
         worksheet.update('A1', values)
         
-        num_rows = len(upload_df) + 1
-        num_cols = len(upload_df.columns)
-        status_col_idx = upload_df.columns.get_loc("STATUS")
+        num_rows = len(rows) + 1
 
         # 4. API Requests
-        requests = []
-
-        # A. Create Native Table with Explicit Column Indices
-        column_props = []
-        for i, col_name in enumerate(upload_df.columns):
-            column_props.append({
-                "columnIndex": i,
-                "columnName": col_name
-            })
-
-        requests.append({
-            "addTable": {
-                "table": {
-                    "name": table_name,
-                    "range": {
-                        "sheetId": worksheet.id,
-                        "startRowIndex": 0, "endRowIndex": num_rows,
-                        "startColumnIndex": 0, "endColumnIndex": num_cols
-                    },
-                    "columnProperties": column_props
-                }
-            }
-        })
-
-        # B. Convert STATUS column to Dropdown "Chips"
-        requests.append({
-            "setDataValidation": {
-                "range": {
-                    "sheetId": worksheet.id,
-                    "startRowIndex": 1, "endRowIndex": num_rows,
-                    "startColumnIndex": status_col_idx, "endColumnIndex": status_col_idx + 1
-                },
-                "rule": {
-                    "condition": {
-                        "type": "ONE_OF_LIST",
-                        "values": [
-                            {"userEnteredValue": "Fully Correct"},
-                            {"userEnteredValue": "Partially correct"},
-                            {"userEnteredValue": "Wrongly answered"},
-                            {"userEnteredValue": "not answered"}
-                        ]
-                    },
-                    "showCustomUi": True, "strict": True
-                }
-            }
-        })
-
-        # C. Header Styling (Dark Green background + White bold text)
-        requests.append({
-            "repeatCell": {
-                "range": {"sheetId": worksheet.id, "startRowIndex": 0, "endRowIndex": 1, "startColumnIndex": 0, "endColumnIndex": num_cols},
-                "cell": {
-                    "userEnteredFormat": {
-                        "backgroundColor": {"red": 0.12, "green": 0.33, "blue": 0.25},
-                        "textFormat": {"foregroundColor": {"red": 1, "green": 1, "blue": 1}, "bold": True},
-                        "horizontalAlignment": "CENTER", "verticalAlignment": "MIDDLE"
-                    }
-                },
-                "fields": "userEnteredFormat(backgroundColor,textFormat,horizontalAlignment,verticalAlignment)"
-            }
-        })
-
-        # D. Column Widths and Text Wrapping
-        # Dimensions: REF(180), QUERY(300), STATUS(150), Expected(450), Generated(450)
-        col_widths = [180, 300, 150, 450, 450]
-        for i, width in enumerate(col_widths):
-            if i < num_cols:
-                requests.append({
-                    "updateDimensionProperties": {
-                        "range": {"sheetId": worksheet.id, "dimension": "COLUMNS", "startIndex": i, "endIndex": i + 1},
-                        "properties": {"pixelSize": width},
-                        "fields": "pixelSize"
-                    }
-                })
-
-        # Enable text wrapping for better readability
-        requests.append({
-            "repeatCell": {
-                "range": {"sheetId": worksheet.id, "startRowIndex": 1, "endRowIndex": num_rows, "startColumnIndex": 0, "endColumnIndex": num_cols},
-                "cell": {"userEnteredFormat": {"wrapStrategy": "WRAP", "verticalAlignment": "TOP"}},
-                "fields": "userEnteredFormat(wrapStrategy,verticalAlignment)"
-            }
-        })
+        requests = _format_requests(worksheet.id, header, num_rows, table_name)
 
         # 5. Execute API Call
         sh.batch_update({"requests": requests})
@@ -150,4 +191,152 @@ def upload_to_google_sheets(df, sheet_name):
 
     except Exception as e:
         print(f"\n⚠️ Google Sheets upload failed: {e}")
-        return False
\ No newline at end of file
+        return False
+
+class _WriteThrottle:
+    """
+    Token bucket sized to the Sheets API write quota (per-user requests per minute).
+    take() blocks until a write is allowed.
+    """
+
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, per_minute / 6.0)  # allow short bursts of ~10s worth
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def take(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            time.sleep((1 - self.tokens) / self.rate)
+
+class SheetsPublisher:
+    """
+    Streams result rows to Google Sheets from a background thread while the run continues.
+
+    publish() only puts the row on a queue. The publisher thread collects rows
+    and every `flush_seconds` sends one append_rows call per sheet with all
+    rows that arrived since the last flush, throttled to `writes_per_minute`.
+    Table, dropdown and formatting requests for every sheet are sent once, in a
+    single batch_update, when close() is called.
+    """
+
+    _CLOSE = object()
+
+    def __init__(self, flush_seconds=5.0, writes_per_minute=50, max_retries=5):
+        self.flush_seconds = flush_seconds
+        self.throttle = _WriteThrottle(writes_per_minute)
+        self.max_retries = max_retries
+        self.queue = queue.Queue()
+        self.sheets = {}  # sheet name -> {"worksheet", "header", "written", "pending"}
+        self.spreadsheet = None
+        self.thread = threading.Thread(target=self._run, name="sheets-publisher", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def publish(self, sheet_name, row):
+        """Queues one result row (a dict with the result columns) for `sheet_name`."""
+        columns = _columns(row)
+        values = ["" if row.get(c) is None else row.get(c) for c in columns]
+        self.queue.put((sheet_name, [COLUMN_MAPPING[c] for c in columns], values))
+
+    def close(self):
+        """Flushes everything still queued, applies formatting and stops the thread."""
+        self.queue.put(self._CLOSE)
+        self.thread.join()
+
+    def _call(self, func, *args, **kwargs):
+        """One throttled API write, retried with backoff on quota (429) errors."""
+        for attempt in range(self.max_retries):
+            self.throttle.take()
+            try:
+                return func(*args, **kwargs)
+            except _gspread().exceptions.APIError as e:
+                if "429" not in str(e) or attempt == self.max_retries - 1:
+                    raise
+                time.sleep(min(2 ** attempt * 5, 60))
+
+    def _run(self):
+        try:
+            self.spreadsheet = _open_spreadsheet()
+        except Exception as e:
+            print(f"\n⚠️ Google Sheets unavailable: {e}")
+            self.spreadsheet = None
+
+        last_flush = time.monotonic()
+        closing = False
+        while not closing:
+            timeout = max(0.0, self.flush_seconds - (time.monotonic() - last_flush))
+            try:
+                items = [self.queue.get(timeout=timeout)]
+            except queue.Empty:
+                items = []
+            # Coalesce everything that is already waiting
+            while True:
+                try:
+                    items.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            for item in items:
+                if item is self._CLOSE:
+                    closing = True
+                    continue
+                if self.spreadsheet is None:
+                    # No credentials: drop rows instead of holding them until exit
+                    continue
+                sheet_name, header, values = item
+                sheet = self.sheets.setdefault(sheet_name, {"worksheet": None, "header": header, "written": 0, "pending": []})
+                sheet["pending"].append(values)
+
+            if self.spreadsheet is None:
+                continue
+            if closing or time.monotonic() - last_flush >= self.flush_seconds:
+                self._flush()
+                last_flush = time.monotonic()
+
+        if self.spreadsheet is not None:
+            self._finalize()
+
+    def _flush(self):
+        for sheet_name, sheet in self.sheets.items():
+            if not sheet["pending"]:
+                continue
+            try:
+                rows = sheet["pending"]
+                worksheet = sheet["worksheet"]
+                if worksheet is None:
+                    try:
+                        worksheet = self._call(self.spreadsheet.worksheet, sheet_name)
+                        self._call(worksheet.clear)
+                    except _gspread().exceptions.WorksheetNotFound:
+                        worksheet = self._call(self.spreadsheet.add_worksheet, title=sheet_name, rows=100, cols=10)
+                    rows = [sheet["header"]] + rows
+                self._call(worksheet.append_rows, rows, value_input_option="RAW", table_range="A1")
+                # Only once the header is written; a failed first write starts over next flush
+                sheet["worksheet"] = worksheet
+                sheet["written"] += len(sheet["pending"])
+                sheet["pending"] = []
+            except Exception as e:
+                print(f"\n⚠️ Google Sheets update failed for {sheet_name}: {e}")
+
+    def _finalize(self):
+        requests = []
+        for sheet in self.sheets.values():
+            if sheet["worksheet"] is None or not sheet["written"]:
+                continue
+            requests += _format_requests(sheet["worksheet"].id, sheet["header"], sheet["written"] + 1, _table_name())
+        if not requests:
+            return
+        try:
+            self._call(self.spreadsheet.batch_update, {"requests": requests})
+            print(f"✓ Native Tables created for {len(self.sheets)} sheet(s).")
+        except Exception as e:
+            print(f"\n⚠️ Google Sheets formatting failed: {e}")
@@ -0,0 +1,10 @@
+import importlib
+import os
+import sys
+
+# Modules live at the repo root; without a local config.py the template's defaults stand in
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+try:
+    import config  # noqa: F401
+except ImportError:
+    sys.modules["config"] = importlib.import_module("config_template")
@@ -0,0 +1,58 @@
+import json
+
+import generator
+
+CASES = [
+    {"question": "What is the revenue?", "expected_answer": "$5M",
+     "metadata": {"page": 3, "quote": "Revenue was $5M", "question_type": "fact"}},
+    {"question": "Who signed {the} \"deal\"?", "expected_answer": "Ann \\ Bob",
+     "metadata": {"page": 7, "section": "Deals", "question_type": "entity"}},
+]
+
+def test_complete_list():
+    cases, complete = generator.salvage_json_cases(json.dumps(CASES))
+    assert cases == CASES
+    assert complete
+
+def test_wrapped_in_object():
+    cases, complete = generator.salvage_json_cases(json.dumps({"questions": CASES}))
+    assert cases == CASES
+    assert complete
+
+def test_code_fences():
+    text = "```json\n" + json.dumps(CASES, indent=2) + "\n```\n"
+    cases, complete = generator.salvage_json_cases(text)
+    assert cases == CASES
+    assert complete
+
+def test_truncated_keeps_complete_objects():
+    text = json.dumps(CASES + [{"question": "Cut off", "expected_answer": "x"}])
+    text = text[:text.rindex("expected_answer") + 5]
+    cases, complete = generator.salvage_json_cases(text)
+    # Nested metadata objects close first but are not cases themselves
+    assert cases == CASES
+    assert not complete
+
+def test_truncated_inside_nested_metadata():
+    text = json.dumps(CASES)
+    text = text[:text.rindex('"section"')]
+    cases, complete = generator.salvage_json_cases(text)
+    assert cases == CASES[:1]
+    assert not complete
+
+def test_truncated_with_unclosed_fence():
+    text = "```json\n" + json.dumps(CASES, indent=2)[:-10]
+    cases, complete = generator.salvage_json_cases(text)
+    assert cases == CASES[:1]
+    assert not complete
+
+def test_braces_and_quotes_inside_strings():
+    # The second case's strings hold braces and escaped quotes; the list is never closed
+    text = json.dumps(CASES)[:-1]
+    cases, complete = generator.salvage_json_cases(text)
+    assert cases == CASES
+    assert not complete
+
+def test_empty_and_garbage():
+    assert generator.salvage_json_cases("") == ([], False)
+    assert generator.salvage_json_cases("I could not generate questions.") == ([], False)
@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+import json_codec
+
+WITH_SUMMARY = json.dumps({
+    "id": 12,
+    "sources": [{"uri": "s3://b/a.pdf", "text": "braces } ] { [ and \"quotes\" \\"}, [1, 2.5, None]],
+    "meta": {"nested": {"deep": ["x", {"y": "}"}]}, "ok": True},
+    "summary": "Revenue grew 5% — \"strongly\" \\ café\nsecond line 😀",
+    "after": "not needed"
+}, ensure_ascii=False).encode("utf-8")
+
+WITHOUT_SUMMARY = json.dumps({
+    "answer": {"text": "summary", "summary": ["not", "a", "string"]},
+    "escaped": "\\\"summary\\\": \"fake\"",
+    "count": -3e2
+}).encode("utf-8")
+
+def chunks(body, size):
+    return [body[i:i + size] for i in range(0, len(body), size)]
+
+def scan(body, size):
+    scanner = json_codec.SummaryScanner()
+    stopped = False
+    for chunk in chunks(body, size):
+        if scanner.feed(chunk):
+            stopped = True
+            break
+    return scanner, stopped
+
+@pytest.mark.parametrize("size", range(1, len(WITH_SUMMARY) + 1))
+def test_summary_found_at_every_chunk_size(size):
+    scanner, stopped = scan(WITH_SUMMARY, size)
+    assert stopped
+    assert scanner.result() == {"summary": json.loads(WITH_SUMMARY)["summary"]}
+
+@pytest.mark.parametrize("size", range(1, len(WITHOUT_SUMMARY) + 1))
+def test_no_summary_decodes_whole_body(size):
+    scanner, stopped = scan(WITHOUT_SUMMARY, size)
+    assert not stopped
+    assert scanner.result() == json.loads(WITHOUT_SUMMARY)
+
+def test_summary_not_a_string():
+    body = b'{"summary": null, "other": 1}'
+    scanner, stopped = scan(body, 4)
+    assert not stopped
+    assert scanner.result() == {"summary": None, "other": 1}
+
+def test_not_json():
+    scanner, stopped = scan(b"Internal Server Error", 5)
+    assert not stopped
+    assert scanner.result() == "Internal Server Error"
+
+class _Response:
+    def __init__(self, body):
+        self.body = body
+        self.read = 0
+
+    def iter_content(self, chunk_size):
+        for chunk in chunks(self.body, chunk_size):
+            self.read += len(chunk)
+            yield chunk
+
+def test_read_summary_stops_early():
+    body = b'{"summary": "short"' + b', "padding": "' + b"x" * 100000 + b'"}'
+    response = _Response(body)
+    assert json_codec.read_summary(response, chunk_size=1024) == {"summary": "short"}
+    assert response.read < len(body)
@@ -0,0 +1,34 @@
+import quote_index
+
+DOC = ("Annual report. In 2023 revenue grew 12% to $4.5 billion, driven by cloud sales. "
+       "Operating margin improved to 31%.")
+
+def make_index():
+    return quote_index.QuoteIndex([(1, "Annual report."), (2, DOC)])
+
+def test_exact_quote():
+    assert make_index().find("revenue grew 12% to $4.5 billion") == (1.0, 2)
+
+def test_inserted_word():
+    score, page = make_index().find("revenue grew by 12% to $4.5 billion")
+    assert score >= 0.6
+    assert page == 2
+
+def test_substituted_word():
+    score, page = make_index().find("revenue grew 15% to $4.5 billion")
+    assert score >= 0.6
+    assert page == 2
+
+def test_unrelated_quote():
+    score, _ = make_index().find("the company fired its chief executive in march")
+    assert score < 0.6
+
+def test_inserted_word_kept_in_drop_mode():
+    cases = [{"question": "q", "metadata": {"page": "1", "quote": "revenue grew by 12% to $4.5 billion"}}]
+    kept = quote_index.verify_cases(cases, [make_index()])
+    assert len(kept) == 1
+    assert kept[0]["metadata"]["quote_verified"] is True
+    assert kept[0]["metadata"]["page"] == "2"
+
+def test_short_quote_not_checked():
+    assert make_index().find("revenue grew") == (None, None)
@@ -0,0 +1,245 @@
+import argparse
+import hashlib
+import re
+import sqlite3
+import time
+
+FULLY_CORRECT = "Fully Correct"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id      INTEGER PRIMARY KEY,
+    started_at  TEXT NOT NULL,
+    label       TEXT,
+    mode        TEXT
+);
+CREATE TABLE IF NOT EXISTS files (
+    file_id     INTEGER PRIMARY KEY,
+    name        TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id          INTEGER NOT NULL,
+    file_id         INTEGER NOT NULL,
+    question_hash   INTEGER NOT NULL,
+    status          TEXT,
+    prev_status     TEXT,
+    question        TEXT,
+    expected        TEXT,
+    response        TEXT,
+    page_section    TEXT,
+    ttft            REAL,
+    tokens_per_sec  REAL,
+    bm25_rank       REAL,
+    difficulty      TEXT
+);
+CREATE INDEX IF NOT EXISTS results_run_file ON results (run_id, file_id, status);
+CREATE INDEX IF NOT EXISTS results_file_run ON results (file_id, run_id);
+CREATE INDEX IF NOT EXISTS results_question ON results (question_hash, run_id, status);
+CREATE INDEX IF NOT EXISTS results_status ON results (status, run_id);
+
+-- Per (run, file) counts, written with the rows so trend queries never scan results
+CREATE TABLE IF NOT EXISTS run_files (
+    run_id      INTEGER NOT NULL,
+    file_id     INTEGER NOT NULL,
+    total       INTEGER NOT NULL,
+    fully       INTEGER NOT NULL,
+    regressed   INTEGER NOT NULL,
+    PRIMARY KEY (run_id, file_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS run_files_file ON run_files (file_id, run_id);
+
+-- Running history per question, updated on every run
+CREATE TABLE IF NOT EXISTS questions (
+    question_hash   INTEGER PRIMARY KEY,
+    file_id         INTEGER NOT NULL,
+    question        TEXT,
+    runs            INTEGER NOT NULL,
+    fully           INTEGER NOT NULL,
+    flips           INTEGER NOT NULL,
+    last_status     TEXT,
+    last_run        INTEGER
+);
+CREATE INDEX IF NOT EXISTS questions_flips ON questions (flips, runs);
+"""
+
+def question_hash(filename, question):
+    """
+    Stable 64-bit id for a question on a document. Case and whitespace are
+    ignored, so a regenerated question with the same wording maps to the same id.
+    """
+    text = re.sub(r"\s+", " ", f"{filename}\n{question or ''}").strip().lower()
+    return int.from_bytes(hashlib.sha1(text.encode("utf-8")).digest()[:8], "big", signed=True)
+
+def _number(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if value != value else value  # NaN -> NULL
+
+class Warehouse:
+    """
+    Local SQLite store of every run's result rows, for comparing runs over time.
+    Rollups (run_files, questions) are maintained at write time, so the
+    analytics queries read a handful of index pages rather than every row.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def _file_id(self, name, cache):
+        file_id = cache.get(name)
+        if file_id is None:
+            self.db.execute("INSERT OR IGNORE INTO files (name) VALUES (?)", (name,))
+            file_id = self.db.execute("SELECT file_id FROM files WHERE name = ?", (name,)).fetchone()[0]
+            cache[name] = file_id
+        return file_id
+
+    def record_run(self, rows, label=None, mode=None):
+        """
+        Stores one run's rows (a ResultTable or any iterable of row dicts) in a
+        single transaction. Returns the new run_id.
+        """
+        file_ids = {}
+        counts = {}
+        with self.db:
+            run_id = self.db.execute("INSERT INTO runs (started_at, label, mode) VALUES (?, ?, ?)",
+                                     (time.strftime("%Y-%m-%d %H:%M:%S"), label, mode)).lastrowid
+            batch = []
+            for row in rows:
+                filename = row.get("Filename") or ""
+                if row.get("Target"):
+                    # A/B runs: each target's history is tracked as its own document
+                    filename = f"{filename} @ {row['Target']}"
+                file_id = self._file_id(filename, file_ids)
+                qhash = question_hash(filename, row.get("Question"))
+                status = row.get("Status")
+
+                previous = self.db.execute("SELECT last_status FROM questions WHERE question_hash = ?",
+                                           (qhash,)).fetchone()
+                prev_status = previous[0] if previous else None
+                fully = int(status == FULLY_CORRECT)
+                flipped = int(previous is not None and prev_status != status)
+                self.db.execute("""
+                    INSERT INTO questions (question_hash, file_id, question, runs, fully, flips, last_status, last_run)
+                    VALUES (?, ?, ?, 1, ?, 0, ?, ?)
+                    ON CONFLICT (question_hash) DO UPDATE SET
+                        runs = runs + 1, fully = fully + excluded.fully, flips = flips + ?,
+                        last_status = excluded.last_status, last_run = excluded.last_run
+                """, (qhash, file_id, row.get("Question"), fully, status, run_id, flipped))
+
+                total = counts.setdefault(file_id, [0, 0, 0])
+                total[0] += 1
+                total[1] += fully
+                total[2] += int(prev_status == FULLY_CORRECT and not fully)
+
+                batch.append((run_id, file_id, qhash, status, prev_status, row.get("Question"),
+                              row.get("Expected Answer"), row.get("RAG Response"), row.get("Page/Section"),
+                              _number(row.get("TTFT (s)")), _number(row.get("Tokens/s")),
+                              _number(row.get("BM25 Rank")), row.get("Difficulty")))
+                if len(batch) >= 1000:
+                    self._insert(batch)
+                    batch = []
+            self._insert(batch)
+            self.db.executemany("INSERT INTO run_files (run_id, file_id, total, fully, regressed) VALUES (?, ?, ?, ?, ?)",
+                                [(run_id, file_id, *c) for file_id, c in counts.items()])
+        return run_id
+
+    def _insert(self, batch):
+        self.db.executemany("INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", batch)
+
+    def accuracy_over_time(self, limit=20, filename=None):
+        """(run_id, started_at, label, total, accuracy %) per run, newest first."""
+        where, params = "", []
+        if filename:
+            where = "WHERE rf.file_id = (SELECT file_id FROM files WHERE name = ?)"
+            params.append(filename)
+        return self.db.execute(f"""
+            SELECT r.run_id, r.started_at, COALESCE(r.label, ''), SUM(rf.total),
+                   ROUND(100.0 * SUM(rf.fully) / MAX(SUM(rf.total), 1), 1)
+            FROM run_files rf JOIN runs r ON r.run_id = rf.run_id
+            {where}
+            GROUP BY r.run_id ORDER BY r.run_id DESC LIMIT ?
+        """, params + [limit]).fetchall()
+
+    def regressions(self, run_id=None):
+        """
+        Documents whose accuracy dropped in `run_id` (default: latest run) compared
+        with the previous run that tested the same document:
+        (file, previous %, current %, change, questions that stopped being Fully Correct).
+        """
+        if run_id is None:
+            run_id = self.db.execute("SELECT MAX(run_id) FROM runs").fetchone()[0]
+        return self.db.execute("""
+            SELECT f.name,
+                   ROUND(100.0 * p.fully / p.total, 1) AS before,
+                   ROUND(100.0 * c.fully / c.total, 1) AS after,
+                   ROUND(100.0 * c.fully / c.total - 100.0 * p.fully / p.total, 1) AS delta,
+                   c.regressed
+            FROM run_files c
+            JOIN files f ON f.file_id = c.file_id
+            JOIN run_files p ON p.file_id = c.file_id AND p.run_id = (
+                SELECT MAX(run_id) FROM run_files WHERE file_id = c.file_id AND run_id < c.run_id)
+            WHERE c.run_id = ? AND (delta < 0 OR c.regressed > 0)
+            ORDER BY delta, c.regressed DESC
+        """, (run_id,)).fetchall()
+
+    def flaky_questions(self, min_runs=3, limit=20):
+        """
+        Questions whose status changed between runs: (file, question, runs,
+        status changes, Fully Correct %, last status), most changes first.
+        """
+        return self.db.execute("""
+            SELECT f.name, q.question, q.runs, q.flips,
+                   ROUND(100.0 * q.fully / q.runs, 1), q.last_status
+            FROM questions q JOIN files f ON f.file_id = q.file_id
+            WHERE q.flips > 0 AND q.runs >= ?
+            ORDER BY q.flips DESC, q.runs DESC LIMIT ?
+        """, (min_runs, limit)).fetchall()
+
+def _print_table(header, rows):
+    rows = [["" if v is None else str(v) for v in row] for row in rows]
+    widths = [min(60, max([len(h)] + [len(r[i]) for r in rows])) for i, h in enumerate(header)]
+    print("  ".join(h.ljust(w) for h, w in zip(header, widths)))
+    for row in rows:
+        print("  ".join(v[:w].ljust(w) for v, w in zip(row, widths)))
+    if not rows:
+        print("(no rows)")
+
+def main(argv=None):
+    import config
+    parser = argparse.ArgumentParser(description="Query the results warehouse across runs.")
+    parser.add_argument("--db", default=getattr(config, "WAREHOUSE_PATH", "rag_results.db") or "rag_results.db")
+    commands = parser.add_subparsers(dest="command", required=True)
+    accuracy = commands.add_parser("accuracy", help="Accuracy per run, newest first")
+    accuracy.add_argument("--file", help="Only this document")
+    accuracy.add_argument("--limit", type=int, default=20)
+    regressions = commands.add_parser("regressions", help="Documents that got worse since their previous run")
+    regressions.add_argument("--run", type=int, help="Run to check (default: latest)")
+    flaky = commands.add_parser("flaky", help="Questions whose status keeps changing")
+    flaky.add_argument("--min-runs", type=int, default=3)
+    flaky.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    store = Warehouse(args.db)
+    try:
+        if args.command == "accuracy":
+            _print_table(["Run", "Started", "Label", "Questions", "Accuracy %"],
+                         store.accuracy_over_time(args.limit, args.file))
+        elif args.command == "regressions":
+            _print_table(["File", "Before %", "After %", "Change", "Regressed Qs"], store.regressions(args.run))
+        else:
+            _print_table(["File", "Question", "Runs", "Changes", "Fully Correct %", "Last Status"],
+                         store.flaky_questions(args.min_runs, args.limit))
+    finally:
+        store.close()
+
+if __name__ == "__main__":
+    main()